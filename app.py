@@ -1,17 +1,16 @@
+import base64
 import json
 import os
+import time
 import logging
+from datetime import datetime
 from functools import wraps
-from flask import Flask, jsonify, request, render_template, send_file, Response, redirect, url_for, session, flash
+from flask import Flask, jsonify, request, render_template, send_file, Response, redirect, url_for, session, flash, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.middleware.proxy_fix import ProxyFix
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from io import BytesIO
 
 logging.basicConfig(level=logging.DEBUG)
@@ -50,6 +49,7 @@ DATA_FILE = "data/weeks.json"
 
 def init_data():
     from models import User, Schedule, Turma
+    from stats import refresh_turma_counters
     
     admin = User.query.filter_by(role='admin').first()
     if not admin:
@@ -87,7 +87,9 @@ def init_data():
                     conhecimentos=week.get("conhecimentos", ""),
                     recursos=week.get("recursos", "")
                 )
+                schedule.update_capacidade_counters()
                 db.session.add(schedule)
+            refresh_turma_counters([default_turma.id])
             db.session.commit()
     else:
         default_turma = Turma.query.filter_by(user_id=admin.id, nome="Tecnico em Programacao de Jogos Digitais").first()
@@ -108,6 +110,16 @@ def init_data():
             db.session.commit()
 
 
+def _column_exists(table, column):
+    from sqlalchemy import text
+    
+    check_sql = text("""
+        SELECT column_name FROM information_schema.columns 
+        WHERE table_name = :table AND column_name = :column
+    """)
+    return db.session.execute(check_sql, {"table": table, "column": column}).fetchone() is not None
+
+
 def run_migrations():
     """Run database migrations for new columns if they don't exist"""
     from sqlalchemy import text
@@ -125,23 +137,216 @@ def run_migrations():
         ("users", "photo", "ALTER TABLE users ADD COLUMN photo VARCHAR(255) DEFAULT ''"),
         ("users", "photo_data", "ALTER TABLE users ADD COLUMN photo_data TEXT DEFAULT ''"),
         ("users", "photo_mimetype", "ALTER TABLE users ADD COLUMN photo_mimetype VARCHAR(50) DEFAULT ''"),
-        ("schedules", "capacidades_completed", "ALTER TABLE schedules ADD COLUMN capacidades_completed TEXT DEFAULT ''"),
+        ("users", "photo_blob", "ALTER TABLE users ADD COLUMN photo_blob BYTEA"),
+        ("users", "photo_hash", "ALTER TABLE users ADD COLUMN photo_hash VARCHAR(64) DEFAULT ''"),
+        ("schedules", "capacidades_total", "ALTER TABLE schedules ADD COLUMN capacidades_total INTEGER DEFAULT 0"),
+        ("schedules", "capacidades_done", "ALTER TABLE schedules ADD COLUMN capacidades_done INTEGER DEFAULT 0"),
+        ("turmas", "semanas_total", "ALTER TABLE turmas ADD COLUMN semanas_total INTEGER DEFAULT 0"),
+        ("turmas", "semanas_done", "ALTER TABLE turmas ADD COLUMN semanas_done INTEGER DEFAULT 0"),
+        ("turmas", "capacidades_total", "ALTER TABLE turmas ADD COLUMN capacidades_total INTEGER DEFAULT 0"),
+        ("turmas", "capacidades_done", "ALTER TABLE turmas ADD COLUMN capacidades_done INTEGER DEFAULT 0"),
+        ("turmas", "revision", "ALTER TABLE turmas ADD COLUMN revision INTEGER DEFAULT 0"),
+        ("schedules", "capacidades_mask", "ALTER TABLE schedules ADD COLUMN capacidades_mask BIGINT DEFAULT 0"),
+        ("users", "sync_revision", "ALTER TABLE users ADD COLUMN sync_revision INTEGER DEFAULT 0"),
+        ("schedules", "revision", "ALTER TABLE schedules ADD COLUMN revision INTEGER DEFAULT 0"),
+        ("schedules", "updated_at", "ALTER TABLE schedules ADD COLUMN updated_at TIMESTAMP"),
+        ("turmas", "updated_at", "ALTER TABLE turmas ADD COLUMN updated_at TIMESTAMP"),
     ]
+    counter_columns = {"capacidades_total", "capacidades_done", "semanas_total", "semanas_done"}
+    backfill_needed = False
     
     for table, column, sql in migrations:
         try:
-            check_sql = text(f"""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name = :table AND column_name = :column
-            """)
-            result = db.session.execute(check_sql, {"table": table, "column": column}).fetchone()
-            if not result:
+            if not _column_exists(table, column):
                 db.session.execute(text(sql))
                 db.session.commit()
                 logging.info(f"Migration: Added column {column} to {table}")
+                if column in counter_columns:
+                    backfill_needed = True
         except Exception as e:
             db.session.rollback()
             logging.warning(f"Migration warning for {table}.{column}: {e}")
+    
+    init_sync_revisions()
+    migrate_capacidades_completed()
+    
+    if backfill_needed:
+        from stats import backfill_counters
+        updated = backfill_counters()
+        logging.info(f"Migration: Backfilled capacidade counters for {updated} schedules")
+    
+    renumber_duplicate_weeks()
+    ensure_indexes()
+    migrate_photo_data()
+
+
+def init_sync_revisions():
+    """Start each user's sync revision past the per-turma revisions counted before it existed"""
+    from models import User, Turma
+    
+    try:
+        users = User.__table__
+        max_revision = db.select(db.func.coalesce(db.func.max(Turma.revision), 0)).where(
+            Turma.user_id == users.c.id
+        ).scalar_subquery()
+        result = db.session.execute(
+            users.update().where(db.func.coalesce(users.c.sync_revision, 0) < max_revision)
+            .values(sync_revision=max_revision)
+        )
+        db.session.commit()
+        if result.rowcount:
+            logging.info(f"Migration: Initialized the sync revision of {result.rowcount} users")
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"Migration warning for users.sync_revision: {e}")
+
+
+def migrate_capacidades_completed(batch_size=1000):
+    """Convert the legacy comma-separated capacidades_completed text into capacidades_mask (one-shot).
+
+    Only databases created before capacidades_mask still have the column; elsewhere this does nothing.
+    """
+    from models import CAPACIDADES_MASK_BITS, capacidades_mask_from_indices, parse_capacidades, parse_capacidades_completed
+    from stats import refresh_turma_counters
+    from sqlalchemy import text
+    
+    try:
+        if not _column_exists("schedules", "capacidades_completed"):
+            return
+        converted = 0
+        turma_ids = set()
+        truncated_ids = []
+        while True:
+            # Converted rows get an empty text, so each pass picks up the next batch
+            rows = db.session.execute(text("""
+                SELECT id, turma_id, capacidades, capacidades_completed FROM schedules
+                WHERE capacidades_completed IS NOT NULL AND capacidades_completed <> ''
+                ORDER BY id LIMIT :limit
+            """), {"limit": batch_size}).fetchall()
+            if not rows:
+                break
+            updates = []
+            for schedule_id, turma_id, capacidades, capacidades_completed in rows:
+                indices = parse_capacidades_completed(capacidades_completed)
+                total = len(parse_capacidades(capacidades))
+                mask = capacidades_mask_from_indices(indices, total)
+                if any(index.strip().isdigit() and CAPACIDADES_MASK_BITS <= int(index) < total for index in indices):
+                    truncated_ids.append(schedule_id)
+                updates.append({"id": schedule_id, "mask": mask, "done": mask.bit_count()})
+                turma_ids.add(turma_id)
+            db.session.execute(text("""
+                UPDATE schedules SET capacidades_mask = :mask, capacidades_done = :done, capacidades_completed = ''
+                WHERE id = :id
+            """), updates)
+            db.session.commit()
+            converted += len(rows)
+        if converted:
+            turma_ids = sorted(turma_ids)
+            for i in range(0, len(turma_ids), batch_size):
+                refresh_turma_counters(turma_ids[i:i + batch_size])
+            db.session.commit()
+            logging.info(f"Migration: Converted capacidades_completed of {converted} schedules to capacidades_mask")
+        if truncated_ids:
+            logging.warning(
+                f"Migration: done marks of capacidades {CAPACIDADES_MASK_BITS}+ do not fit capacidades_mask "
+                f"and were dropped for schedules {', '.join(map(str, truncated_ids))}"
+            )
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"Migration warning for schedules.capacidades_mask: {e}")
+
+
+def renumber_duplicate_weeks():
+    """Move repeated semanas of a turma to the end so (turma_id, semana) can be unique (one-shot)"""
+    from models import Schedule
+    from stats import refresh_turma_counters
+    
+    try:
+        duplicates = db.session.query(Schedule.turma_id, Schedule.semana).group_by(
+            Schedule.turma_id, Schedule.semana
+        ).having(db.func.count(Schedule.id) > 1).all()
+        turma_ids = set()
+        for turma_id, semana in duplicates:
+            ids = [schedule_id for (schedule_id,) in db.session.query(Schedule.id).filter_by(
+                turma_id=turma_id, semana=semana
+            ).order_by(Schedule.id)]
+            max_semana = db.session.query(db.func.max(Schedule.semana)).filter_by(turma_id=turma_id).scalar()
+            for offset, schedule_id in enumerate(ids[1:], 1):
+                db.session.query(Schedule).filter_by(id=schedule_id).update({"semana": max_semana + offset})
+            turma_ids.add(turma_id)
+        if turma_ids:
+            refresh_turma_counters(turma_ids)
+            db.session.commit()
+            logging.info(f"Migration: Renumbered {len(duplicates)} repeated weeks in {len(turma_ids)} turmas")
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"Migration warning for repeated weeks: {e}")
+
+
+def migrate_photo_data():
+    """Convert legacy photos (base64 photo_data or raw photo_blob) into the resized variants (one-shot)"""
+    from models import User
+    import base64
+    
+    try:
+        pending = db.session.query(User.id).filter(
+            db.or_(User.photo_blob.isnot(None), db.and_(User.photo_data.isnot(None), User.photo_data != ''))
+        ).all()
+        for (user_id,) in pending:
+            user = db.session.get(User, user_id)
+            try:
+                photo_bytes = user.photo_blob or base64.b64decode(user.photo_data)
+                user.set_photo(photo_bytes)
+            except Exception as e:
+                logging.warning(f"Migration warning for photo of user {user_id}: {e}")
+                user.photo_data = ''
+                user.photo_blob = None
+                user.photo_hash = ''
+            db.session.commit()
+            db.session.expunge(user)
+        if pending:
+            logging.info(f"Migration: Converted {len(pending)} profile photos to resized variants")
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"Migration warning for profile photos: {e}")
+
+
+def ensure_indexes():
+    """Create the indexes declared on the models if they don't exist (CONCURRENTLY on PostgreSQL)"""
+    from models import Turma, Schedule
+    from sqlalchemy import text
+    
+    is_postgres = db.engine.dialect.name == "postgresql"
+    concurrently = "CONCURRENTLY " if is_postgres else ""
+    
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in (Turma.__table__, Schedule.__table__):
+            for index in table.indexes:
+                try:
+                    if is_postgres:
+                        valid = conn.execute(text("""
+                            SELECT i.indisvalid FROM pg_index i
+                            JOIN pg_class c ON c.oid = i.indexrelid
+                            WHERE c.relname = :name
+                        """), {"name": index.name}).scalar()
+                        if valid is False:
+                            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+                            logging.info(f"Migration: Dropped invalid index {index.name}")
+                    
+                    columns = ", ".join(column.name for column in index.columns)
+                    unique = "UNIQUE " if index.unique else ""
+                    conn.execute(text(
+                        f"CREATE {unique}INDEX {concurrently}IF NOT EXISTS {index.name} ON {table.name} ({columns})"
+                    ))
+                except Exception as e:
+                    logging.warning(f"Migration warning for index {index.name}: {e}")
+        
+        # Superseded by uq_schedules_turma_semana
+        for name in ("ix_schedules_turma_semana",):
+            try:
+                conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+            except Exception as e:
+                logging.warning(f"Migration warning for index {name}: {e}")
 
 
 with app.app_context():
@@ -151,13 +356,85 @@ with app.app_context():
     init_data()
 
 
+@app.cli.command("backfill-counters")
+def backfill_counters_command():
+    """Rebuild the capacidade/semana counters from the schedules text"""
+    from stats import backfill_counters
+    updated = backfill_counters()
+    print(f"{updated} schedule(s) atualizados; contadores das turmas recalculados.")
+
+
+@app.cli.command("check-counters")
+def check_counters_command():
+    """Diff the persisted counters against the re-parsed capacidades text"""
+    from stats import find_counter_mismatches
+    mismatches = find_counter_mismatches()
+    for mismatch in mismatches:
+        print(f"{mismatch['table']}#{mismatch['id']}: esperado {mismatch['expected']}, atual {mismatch['actual']}")
+    print(f"{len(mismatches)} divergencia(s) encontrada(s).")
+    if mismatches:
+        raise SystemExit(1)
+
+
+USER_STATUS_TTL = 10
+_user_status_cache = {}
+
+
+def current_user():
+    """Logged-in User for this request, loaded at most once and cached on flask.g"""
+    from models import User
+    
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = db.session.get(User, user_id) if user_id else None
+    return g.current_user
+
+
+def invalidate_user_cache(user_id):
+    _user_status_cache.pop(user_id, None)
+    if 'current_user' in g and g.current_user is not None and g.current_user.id == user_id:
+        g.pop('current_user')
+
+
+def get_user_status(user_id):
+    """(active, role) of a user, cached for USER_STATUS_TTL seconds per worker"""
+    cached = _user_status_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    
+    user = current_user()
+    active, role = (bool(user.active), user.role) if user else (False, None)
+    _user_status_cache[user_id] = (time.monotonic() + USER_STATUS_TTL, active, role)
+    return active, role
+
+
+def _wants_json():
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.path.startswith('/api/')
+
+
+def _check_session():
+    if 'user_id' not in session:
+        if _wants_json():
+            return None, (jsonify({"error": "Nao autorizado"}), 401)
+        return None, redirect(url_for('login'))
+    
+    active, role = get_user_status(session['user_id'])
+    if not active:
+        session.clear()
+        if _wants_json():
+            return None, (jsonify({"error": "Nao autorizado"}), 401)
+        flash("Sua conta foi desativada. Procure um administrador.", "error")
+        return None, redirect(url_for('login'))
+    
+    return role, None
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.path.startswith('/api/'):
-                return jsonify({"error": "Nao autorizado"}), 401
-            return redirect(url_for('login'))
+        role, error = _check_session()
+        if error:
+            return error
         return f(*args, **kwargs)
     return decorated_function
 
@@ -165,12 +442,11 @@ def login_required(f):
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.path.startswith('/api/'):
-                return jsonify({"error": "Nao autorizado"}), 401
-            return redirect(url_for('login'))
-        if session.get('user_role') != 'admin':
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.path.startswith('/api/'):
+        role, error = _check_session()
+        if error:
+            return error
+        if role != 'admin':
+            if _wants_json():
                 return jsonify({"error": "Acesso negado"}), 403
             flash("Acesso negado. Apenas administradores podem acessar esta area.", "error")
             return redirect(url_for('index'))
@@ -178,6 +454,55 @@ def admin_required(f):
     return decorated_function
 
 
+PAGE_LIMIT_DEFAULT = 100
+PAGE_LIMIT_MAX = 500
+
+
+def _encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, *parsers):
+    """Cursor values run through one parser per sort column; raises ValueError if malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError(cursor)
+        return [parse(value) for parse, value in zip(parsers, values)]
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError(f"Cursor invalido: {cursor}")
+
+
+def _cursor_datetime(value):
+    return None if value is None else datetime.fromisoformat(value)
+
+
+def _pagination_args(*parsers):
+    """(limit, cursor values) from the query string, or (None, None) when the client asked for no page"""
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    if limit is None and not cursor:
+        return None, None
+    limit = min(max(limit or PAGE_LIMIT_DEFAULT, 1), PAGE_LIMIT_MAX)
+    return limit, _decode_cursor(cursor, *parsers) if cursor else None
+
+
+def _keyset_page(query, limit, sort_key):
+    """Runs a query already filtered past the cursor; returns the page and the cursor of the next one"""
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], _encode_cursor(sort_key(rows[limit - 1]))
+
+
+def _page_response(items, next_cursor):
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     from models import User
@@ -218,19 +543,19 @@ def logout():
 @app.route("/")
 @login_required
 def index():
-    from models import User
-    user_data = User.query.get(session['user_id'])
-    has_photo = bool(user_data and user_data.photo_data)
-    return render_template("index.html", user=session, user_id=session['user_id'], has_photo=has_photo)
+    user_data = current_user()
+    has_photo = bool(user_data and user_data.has_photo)
+    photo_version = user_data.photo_version if has_photo else ''
+    return render_template("index.html", user=session, user_id=session['user_id'], has_photo=has_photo, photo_version=photo_version)
 
 
 @app.route("/dashboard")
 @login_required
 def dashboard():
-    from models import Schedule, User
+    from models import Schedule
     
     user_id = session['user_id']
-    schedules = Schedule.query.filter_by(user_id=user_id).order_by(Schedule.semana).all()
+    schedules = Schedule.query_with_turma().filter_by(user_id=user_id).order_by(Schedule.semana).all()
     
     weeks = [s.to_dict() for s in schedules]
     
@@ -243,8 +568,9 @@ def dashboard():
             for r in s.recursos.split(','):
                 recursos_set.add(r.strip())
     
-    user_data = User.query.get(user_id)
-    has_photo = bool(user_data and user_data.photo_data)
+    user_data = current_user()
+    has_photo = bool(user_data and user_data.has_photo)
+    photo_version = user_data.photo_version if has_photo else ''
     
     return render_template("dashboard.html", 
                           user=session, 
@@ -252,7 +578,8 @@ def dashboard():
                           weeks=weeks,
                           unidades=list(unidades),
                           recursos=list(recursos_set),
-                          has_photo=has_photo)
+                          has_photo=has_photo,
+                          photo_version=photo_version)
 
 
 @app.route("/admin")
@@ -264,17 +591,17 @@ def admin_panel():
 @app.route("/turmas")
 @login_required
 def turmas_page():
-    from models import User
-    user_data = User.query.get(session['user_id'])
-    has_photo = bool(user_data and user_data.photo_data)
-    return render_template("turmas.html", user=session, user_id=session['user_id'], has_photo=has_photo)
+    user_data = current_user()
+    has_photo = bool(user_data and user_data.has_photo)
+    photo_version = user_data.photo_version if has_photo else ''
+    return render_template("turmas.html", user=session, user_id=session['user_id'], has_photo=has_photo, photo_version=photo_version)
 
 
 @app.route("/perfil")
 @login_required
 def perfil_page():
-    from models import User, Turma, Schedule
-    user = User.query.get(session['user_id'])
+    from models import Turma, Schedule
+    user = current_user()
     user_id = session['user_id']
     
     turmas_encerradas = Turma.query.filter_by(user_id=user_id, active=True, concluida=True).count()
@@ -295,10 +622,7 @@ def perfil_page():
 @app.route("/perfil/atualizar", methods=["POST"])
 @login_required
 def atualizar_perfil():
-    from models import User
-    import base64
-    
-    user = User.query.get(session['user_id'])
+    user = current_user()
     if not user:
         flash("Usuario nao encontrado.", "error")
         return redirect(url_for('perfil_page'))
@@ -315,26 +639,16 @@ def atualizar_perfil():
     if 'photo' in request.files:
         photo = request.files['photo']
         if photo and photo.filename and photo.filename.strip():
-            allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-            ext = photo.filename.rsplit('.', 1)[-1].lower() if '.' in photo.filename else ''
-            if ext in allowed_extensions:
-                mime_types = {
-                    'png': 'image/png',
-                    'jpg': 'image/jpeg',
-                    'jpeg': 'image/jpeg',
-                    'gif': 'image/gif',
-                    'webp': 'image/webp'
-                }
-                photo_data = base64.b64encode(photo.read()).decode('utf-8')
-                user.photo_data = photo_data
-                user.photo_mimetype = mime_types.get(ext, 'image/jpeg')
+            try:
+                user.set_photo(photo.read())
                 user.photo = f"db_photo_{user.id}"
-            else:
-                flash("Formato de imagem nao permitido. Use PNG, JPG, JPEG, GIF ou WEBP.", "error")
+            except ValueError as e:
+                flash(str(e), "error")
                 return redirect(url_for('perfil_page'))
     
     try:
         db.session.commit()
+        invalidate_user_cache(user.id)
         flash("Perfil atualizado com sucesso!", "success")
     except Exception as e:
         db.session.rollback()
@@ -345,16 +659,29 @@ def atualizar_perfil():
 
 @app.route("/api/user-photo/<int:user_id>")
 def get_user_photo(user_id):
-    from models import User
-    import base64
+    from models import User, UserPhoto
+    from photos import pick_photo_size
+    
+    size = pick_photo_size(request.args.get('size', type=int))
+    photo = db.session.query(User.photo_hash, User.photo_mimetype).filter_by(id=user_id).first()
+    response = None
+    if photo and photo.photo_hash:
+        etag = f"{photo.photo_hash}-{size}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            photo_bytes = db.session.query(UserPhoto.data).filter_by(user_id=user_id, size=size).scalar()
+            response = Response(photo_bytes, mimetype=photo.photo_mimetype or 'image/jpeg') if photo_bytes else None
     
-    user = User.query.get(user_id)
-    if user and user.photo_data:
-        try:
-            photo_bytes = base64.b64decode(user.photo_data)
-            return Response(photo_bytes, mimetype=user.photo_mimetype or 'image/jpeg')
-        except Exception:
-            pass
+    if response is not None:
+        response.set_etag(etag)
+        
+        version = request.args.get('v', '')
+        if version and version == photo.photo_hash[:12]:
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = 'public, no-cache'
+        return response
     
     svg_placeholder = '''<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100" viewBox="0 0 100 100">
         <circle cx="50" cy="50" r="50" fill="#e2e8f0"/>
@@ -367,9 +694,7 @@ def get_user_photo(user_id):
 @app.route("/perfil/alterar-senha", methods=["POST"])
 @login_required
 def alterar_senha():
-    from models import User
-    
-    user = User.query.get(session['user_id'])
+    user = current_user()
     if not user:
         flash("Usuario nao encontrado.", "error")
         return redirect(url_for('perfil_page'))
@@ -410,6 +735,7 @@ def get_turmas():
 @login_required
 def add_turma():
     from models import Turma
+    from sync import next_revision
     from datetime import datetime
     
     user_id = session['user_id']
@@ -455,7 +781,8 @@ def add_turma():
         horario_fim=horario_fim,
         data_inicio=data_inicio,
         data_fim=data_fim,
-        active=True
+        active=True,
+        revision=next_revision(user_id)
     )
     db.session.add(turma)
     db.session.commit()
@@ -467,6 +794,7 @@ def add_turma():
 @login_required
 def update_turma(turma_id):
     from models import Turma
+    from sync import next_revision
     from datetime import datetime
     
     user_id = session['user_id']
@@ -507,6 +835,7 @@ def update_turma(turma_id):
     elif "data_fim" in data and not data_fim_str:
         turma.data_fim = None
     
+    turma.revision = next_revision(user_id)
     db.session.commit()
     
     return jsonify(turma.to_dict())
@@ -516,6 +845,7 @@ def update_turma(turma_id):
 @login_required
 def delete_turma(turma_id):
     from models import Turma
+    from sync import next_revision
     
     user_id = session['user_id']
     turma = Turma.query.filter_by(id=turma_id, user_id=user_id).first()
@@ -524,6 +854,7 @@ def delete_turma(turma_id):
         return jsonify({"error": "Turma nao encontrada"}), 404
     
     turma.active = False
+    turma.revision = next_revision(user_id)
     db.session.commit()
     
     return jsonify({"message": "Turma excluida com sucesso"})
@@ -534,8 +865,28 @@ def delete_turma(turma_id):
 def get_turmas_encerradas():
     from models import Turma
     user_id = session['user_id']
-    turmas = Turma.query.filter_by(user_id=user_id, active=True, concluida=True).order_by(Turma.data_conclusao.desc()).all()
-    return jsonify([t.to_dict() for t in turmas])
+    try:
+        limit, cursor = _pagination_args(_cursor_datetime, int)
+    except ValueError:
+        return jsonify({"error": "Cursor invalido"}), 400
+    
+    query = Turma.query.filter_by(user_id=user_id, active=True, concluida=True).order_by(
+        Turma.data_conclusao.desc().nulls_last(), Turma.id.desc()
+    )
+    if limit is None:
+        return jsonify([t.to_dict() for t in query.all()])
+    
+    if cursor:
+        data_conclusao, turma_id = cursor
+        if data_conclusao is None:
+            query = query.filter(Turma.data_conclusao.is_(None), Turma.id < turma_id)
+        else:
+            query = query.filter(db.or_(
+                db.tuple_(Turma.data_conclusao, Turma.id) < db.tuple_(data_conclusao, turma_id),
+                Turma.data_conclusao.is_(None)
+            ))
+    turmas, next_cursor = _keyset_page(query, limit, lambda t: (t.data_conclusao, t.id))
+    return _page_response([t.to_dict() for t in turmas], next_cursor)
 
 
 @app.route("/api/turmas/<int:turma_id>", methods=["GET"])
@@ -555,6 +906,7 @@ def get_turma(turma_id):
 @login_required
 def encerrar_turma(turma_id):
     from models import Turma
+    from sync import next_revision
     from datetime import datetime
     
     user_id = session['user_id']
@@ -565,6 +917,7 @@ def encerrar_turma(turma_id):
     
     turma.concluida = True
     turma.data_conclusao = datetime.utcnow()
+    turma.revision = next_revision(user_id)
     db.session.commit()
     
     return jsonify({
@@ -577,6 +930,7 @@ def encerrar_turma(turma_id):
 @login_required
 def restaurar_turma(turma_id):
     from models import Turma
+    from sync import next_revision
     
     user_id = session['user_id']
     turma = Turma.query.filter_by(id=turma_id, user_id=user_id, active=True, concluida=True).first()
@@ -586,6 +940,7 @@ def restaurar_turma(turma_id):
     
     turma.concluida = False
     turma.data_conclusao = None
+    turma.revision = next_revision(user_id)
     db.session.commit()
     
     return jsonify({
@@ -594,10 +949,77 @@ def restaurar_turma(turma_id):
     })
 
 
+DUPLICAR_LOTE_MAX = 100
+
+
+def _clone_turma(turma_original, nomes):
+    """Creates one copy of the turma per name and copies its weeks with a single INSERT ... SELECT.
+
+    Progress is not copied. Returns (new turmas, weeks copied per turma); the
+    caller commits.
+    """
+    from datetime import datetime
+    from models import Turma, Schedule
+    from stats import refresh_turma_counters
+    from sync import next_revision
+    
+    revision = next_revision(turma_original.user_id)
+    novas_turmas = [
+        Turma(
+            user_id=turma_original.user_id,
+            nome=nome,
+            descricao=turma_original.descricao,
+            cor=turma_original.cor,
+            carga_horaria=turma_original.carga_horaria,
+            dias_aula=turma_original.dias_aula,
+            horario_inicio=turma_original.horario_inicio,
+            horario_fim=turma_original.horario_fim,
+            data_inicio=None,
+            data_fim=None,
+            active=True,
+            concluida=False,
+            revision=revision
+        )
+        for nome in nomes
+    ]
+    db.session.add_all(novas_turmas)
+    db.session.flush()
+    novos_ids = [turma.id for turma in novas_turmas]
+    
+    # One row per (source week, new turma); the join condition only picks the new turmas
+    copia = db.select(
+        db.literal(turma_original.user_id),
+        Turma.id,
+        Schedule.semana,
+        Schedule.atividades,
+        Schedule.unidade_curricular,
+        Schedule.capacidades,
+        db.literal(0),
+        Schedule.conhecimentos,
+        Schedule.recursos,
+        db.false(),
+        Schedule.capacidades_total,
+        db.literal(0),
+        db.literal(revision),
+        db.literal(datetime.utcnow()),
+    ).join(Turma, Turma.id.in_(novos_ids)).where(
+        Schedule.user_id == turma_original.user_id,
+        Schedule.turma_id == turma_original.id
+    )
+    result = db.session.execute(Schedule.__table__.insert().from_select([
+        'user_id', 'turma_id', 'semana', 'atividades', 'unidade_curricular', 'capacidades',
+        'capacidades_mask', 'conhecimentos', 'recursos', 'completed', 'capacidades_total',
+        'capacidades_done', 'revision', 'created_at'
+    ], copia))
+    
+    refresh_turma_counters(novos_ids, revision=revision)
+    return novas_turmas, result.rowcount // len(novas_turmas)
+
+
 @app.route("/api/turmas/<int:turma_id>/duplicar", methods=["POST"])
 @login_required
 def duplicar_turma(turma_id):
-    from models import Turma, Schedule
+    from models import Turma
     
     user_id = session['user_id']
     data = request.get_json() or {}
@@ -611,42 +1033,7 @@ def duplicar_turma(turma_id):
     if not novo_nome:
         novo_nome = f"{turma_original.nome} (Copia)"
     
-    nova_turma = Turma(
-        user_id=user_id,
-        nome=novo_nome,
-        descricao=turma_original.descricao,
-        cor=turma_original.cor,
-        carga_horaria=turma_original.carga_horaria,
-        dias_aula=turma_original.dias_aula,
-        horario_inicio=turma_original.horario_inicio,
-        horario_fim=turma_original.horario_fim,
-        data_inicio=None,
-        data_fim=None,
-        active=True,
-        concluida=False
-    )
-    db.session.add(nova_turma)
-    db.session.flush()
-    
-    schedules_originais = Schedule.query.filter_by(user_id=user_id, turma_id=turma_id).order_by(Schedule.semana).all()
-    
-    schedules_copiados = 0
-    for schedule in schedules_originais:
-        novo_schedule = Schedule(
-            user_id=user_id,
-            turma_id=nova_turma.id,
-            semana=schedule.semana,
-            atividades=schedule.atividades,
-            unidade_curricular=schedule.unidade_curricular,
-            capacidades=schedule.capacidades,
-            capacidades_completed='',
-            conhecimentos=schedule.conhecimentos,
-            recursos=schedule.recursos,
-            completed=False
-        )
-        db.session.add(novo_schedule)
-        schedules_copiados += 1
-    
+    (nova_turma,), schedules_copiados = _clone_turma(turma_original, [novo_nome])
     db.session.commit()
     
     return jsonify({
@@ -656,10 +1043,52 @@ def duplicar_turma(turma_id):
     }), 201
 
 
+@app.route("/api/turmas/<int:turma_id>/duplicar-lote", methods=["POST"])
+@login_required
+def duplicar_turma_lote(turma_id):
+    from models import Turma
+    
+    user_id = session['user_id']
+    data = request.get_json() or {}
+    
+    turma_original = Turma.query.filter_by(id=turma_id, user_id=user_id, active=True).first()
+    
+    if not turma_original:
+        return jsonify({"error": "Turma nao encontrada"}), 404
+    
+    nomes = data.get("nomes")
+    if not isinstance(nomes, list) or not nomes:
+        return jsonify({"error": "Informe a lista de nomes das novas turmas"}), 400
+    
+    nomes = [nome.strip() if isinstance(nome, str) else '' for nome in nomes]
+    if not all(nomes):
+        return jsonify({"error": "Todos os nomes devem ser preenchidos"}), 400
+    
+    if len(nomes) > DUPLICAR_LOTE_MAX:
+        return jsonify({"error": f"Maximo de {DUPLICAR_LOTE_MAX} turmas por lote"}), 400
+    
+    inicio = time.perf_counter()
+    novas_turmas, schedules_copiados = _clone_turma(turma_original, nomes)
+    novos_ids = [turma.id for turma in novas_turmas]
+    db.session.commit()
+    tempo_ms = round((time.perf_counter() - inicio) * 1000, 1)
+    
+    # Reload the committed turmas in one SELECT instead of one refresh per to_dict()
+    novas_turmas = Turma.query.filter(Turma.id.in_(novos_ids)).order_by(Turma.id).all()
+    
+    return jsonify({
+        "message": f"{len(novas_turmas)} turma(s) criada(s) com sucesso! {schedules_copiados} semanas copiadas para cada uma.",
+        "turmas": [turma.to_dict() for turma in novas_turmas],
+        "schedules_copiados": schedules_copiados,
+        "tempo_ms": tempo_ms
+    }), 201
+
+
 @app.route("/api/turmas/<int:turma_id>/check-conclusao", methods=["GET"])
 @login_required
 def check_turma_conclusao(turma_id):
-    from models import Turma, Schedule
+    from models import Turma
+    from stats import turma_progress
     
     user_id = session['user_id']
     turma = Turma.query.filter_by(id=turma_id, user_id=user_id, active=True).first()
@@ -667,9 +1096,9 @@ def check_turma_conclusao(turma_id):
     if not turma:
         return jsonify({"error": "Turma nao encontrada"}), 404
     
-    schedules = Schedule.query.filter_by(user_id=user_id, turma_id=turma_id).all()
+    stats = turma_progress(turma)
     
-    if not schedules:
+    if not stats['total_weeks']:
         return jsonify({
             "pode_encerrar": False,
             "motivo": "Turma sem semanas cadastradas",
@@ -679,19 +1108,10 @@ def check_turma_conclusao(turma_id):
             "capacidades_concluidas": 0
         })
     
-    total_semanas = len(schedules)
-    semanas_concluidas = sum(1 for s in schedules if s.completed)
-    
-    total_capacidades = 0
-    capacidades_concluidas = 0
-    
-    for s in schedules:
-        caps = [c.strip() for c in s.capacidades.split('\n') if c.strip()]
-        total_capacidades += len(caps)
-        
-        completed_list = s.capacidades_completed.split(',') if s.capacidades_completed else []
-        completed_list = [x for x in completed_list if x]
-        capacidades_concluidas += len(completed_list)
+    total_semanas = stats['total_weeks']
+    semanas_concluidas = stats['completed_weeks']
+    total_capacidades = stats['total_capacidades']
+    capacidades_concluidas = stats['completed_capacidades']
     
     todas_semanas_concluidas = semanas_concluidas == total_semanas
     todas_capacidades_concluidas = capacidades_concluidas == total_capacidades if total_capacidades > 0 else True
@@ -722,8 +1142,20 @@ def check_turma_conclusao(turma_id):
 @admin_required
 def get_users():
     from models import User
-    users = User.query.order_by(User.id).all()
-    return jsonify([u.to_dict() for u in users])
+    
+    try:
+        limit, cursor = _pagination_args(int)
+    except ValueError:
+        return jsonify({"error": "Cursor invalido"}), 400
+    
+    query = User.query.order_by(User.id)
+    if limit is None:
+        return jsonify([u.to_dict() for u in query.all()])
+    
+    if cursor:
+        query = query.filter(User.id > cursor[0])
+    users, next_cursor = _keyset_page(query, limit, lambda u: (u.id,))
+    return _page_response([u.to_dict() for u in users], next_cursor)
 
 
 @app.route("/api/users", methods=["POST"])
@@ -800,6 +1232,7 @@ def update_user(user_id):
         user.password_hash = generate_password_hash(data["password"])
     
     db.session.commit()
+    invalidate_user_cache(user_id)
     
     return jsonify(user.to_dict())
 
@@ -819,6 +1252,7 @@ def delete_user(user_id):
     
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_cache(user_id)
     
     return jsonify({"message": "Usuario excluido com sucesso"})
 
@@ -832,11 +1266,39 @@ def get_user_content(user_id):
     if not user:
         return jsonify({"error": "Usuario nao encontrado"}), 404
     
-    turmas = Turma.query.filter_by(user_id=user_id, active=True).order_by(Turma.nome).all()
+    try:
+        limit, cursor = _pagination_args(int)
+    except ValueError:
+        return jsonify({"error": "Cursor invalido"}), 400
+    
+    next_cursor = None
+    query = Turma.query.filter_by(user_id=user_id, active=True)
+    if limit is None:
+        turmas = query.order_by(Turma.nome).all()
+        total_turmas = len(turmas)
+        total_turmas_concluidas = len([t for t in turmas if t.concluida])
+    else:
+        total_turmas, total_turmas_concluidas = db.session.query(
+            db.func.count(Turma.id),
+            db.func.coalesce(db.func.sum(db.case((Turma.concluida.is_(True), 1), else_=0)), 0)
+        ).filter(Turma.user_id == user_id, Turma.active.is_(True)).one()
+        query = query.order_by(Turma.id)
+        if cursor:
+            query = query.filter(Turma.id > cursor[0])
+        turmas, next_cursor = _keyset_page(query, limit, lambda t: (t.id,))
+    
+    schedules_por_turma = {turma.id: [] for turma in turmas}
+    if turmas:
+        all_schedules = Schedule.query_with_turma().filter(
+            Schedule.user_id == user_id,
+            Schedule.turma_id.in_(list(schedules_por_turma))
+        ).order_by(Schedule.semana).all()
+        for schedule in all_schedules:
+            schedules_por_turma[schedule.turma_id].append(schedule)
     
     turmas_data = []
     for turma in turmas:
-        schedules = Schedule.query.filter_by(user_id=user_id, turma_id=turma.id).order_by(Schedule.semana).all()
+        schedules = schedules_por_turma[turma.id]
         total_semanas = len(schedules)
         semanas_concluidas = sum(1 for s in schedules if s.completed)
         
@@ -846,56 +1308,72 @@ def get_user_content(user_id):
         turma_dict['schedules'] = [s.to_dict() for s in schedules]
         turmas_data.append(turma_dict)
     
-    return jsonify({
+    return _page_response({
         "user": user.to_dict(),
         "turmas": turmas_data,
-        "total_turmas": len(turmas),
-        "total_turmas_ativas": len([t for t in turmas if not t.concluida]),
-        "total_turmas_concluidas": len([t for t in turmas if t.concluida])
-    })
+        "total_turmas": total_turmas,
+        "total_turmas_ativas": total_turmas - total_turmas_concluidas,
+        "total_turmas_concluidas": total_turmas_concluidas
+    }, next_cursor)
 
 
 @app.route("/api/admin/overview", methods=["GET"])
 @admin_required
 def get_admin_overview():
-    from models import User, Turma, Schedule
+    from stats import get_admin_overview as query_admin_overview
     
-    users = User.query.filter_by(active=True).all()
-    overview = []
+    sort = request.args.get('sort')
+    order = request.args.get('order', 'asc')
+    page = request.args.get('page', type=int)
+    if page is not None and page < 1:
+        return jsonify({"error": "Pagina invalida"}), 400
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
     
-    for user in users:
-        turmas_count = Turma.query.filter_by(user_id=user.id, active=True).count()
-        turmas_ativas = Turma.query.filter_by(user_id=user.id, active=True, concluida=False).count()
-        turmas_concluidas = Turma.query.filter_by(user_id=user.id, active=True, concluida=True).count()
-        total_semanas = Schedule.query.filter_by(user_id=user.id).count()
-        semanas_concluidas = Schedule.query.filter_by(user_id=user.id, completed=True).count()
-        
-        overview.append({
-            "user": user.to_dict(),
-            "turmas_count": turmas_count,
-            "turmas_ativas": turmas_ativas,
-            "turmas_concluidas": turmas_concluidas,
-            "total_semanas": total_semanas,
-            "semanas_concluidas": semanas_concluidas
-        })
+    overview, total = query_admin_overview(sort=sort, order=order, page=page, per_page=per_page)
     
-    return jsonify(overview)
+    response = jsonify(overview)
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    return response
 
 
 @app.route("/api/weeks", methods=["GET"])
 @login_required
 def get_weeks():
     from models import Schedule
+    from sync import weeks_since
     
     user_id = session['user_id']
     turma_id = request.args.get('turma_id', type=int)
     
-    query = Schedule.query.filter_by(user_id=user_id)
+    if 'since' in request.args:
+        since = request.args.get('since', type=int)
+        if since is None or since < 0:
+            return jsonify({"error": "Revisao invalida"}), 400
+        schedules, excluidas, revision = weeks_since(user_id, since, turma_id)
+        return jsonify({
+            "semanas": [s.to_dict() for s in schedules],
+            "excluidas": excluidas,
+            "revision": revision
+        })
+    
+    try:
+        limit, cursor = _pagination_args(int, int)
+    except ValueError:
+        return jsonify({"error": "Cursor invalido"}), 400
+    
+    query = Schedule.query_with_turma().filter_by(user_id=user_id)
     if turma_id:
         query = query.filter_by(turma_id=turma_id)
+    query = query.order_by(Schedule.semana, Schedule.id)
     
-    schedules = query.order_by(Schedule.semana).all()
-    return jsonify([s.to_dict() for s in schedules])
+    if limit is None:
+        return jsonify([s.to_dict() for s in query.all()])
+    
+    if cursor:
+        query = query.filter(db.tuple_(Schedule.semana, Schedule.id) > db.tuple_(*cursor))
+    schedules, next_cursor = _keyset_page(query, limit, lambda s: (s.semana, s.id))
+    return _page_response([s.to_dict() for s in schedules], next_cursor)
 
 
 @app.route("/api/weeks/<int:week_id>", methods=["GET"])
@@ -915,6 +1393,8 @@ def get_week(week_id):
 @login_required
 def add_week():
     from models import Schedule, Turma
+    from stats import refresh_turma_counters
+    from sync import next_revision
     
     user_id = session['user_id']
     data = request.get_json()
@@ -930,21 +1410,39 @@ def add_week():
     if not turma:
         return jsonify({"error": "Turma nao encontrada"}), 404
     
-    max_semana = db.session.query(db.func.max(Schedule.semana)).filter_by(user_id=user_id, turma_id=turma_id).scalar() or 0
+    # Take the user's revision lock first: concurrent adds to this turma then see each other's week
+    revision = next_revision(user_id)
+    
+    if "semana" in data:
+        semana = data["semana"]
+    else:
+        semana = (db.session.query(db.func.max(Schedule.semana)).filter_by(user_id=user_id, turma_id=turma_id).scalar() or 0) + 1
+    
+    if Schedule.query.filter_by(turma_id=turma_id, semana=semana).first():
+        db.session.rollback()
+        return jsonify({"error": f"A semana {semana} ja existe nesta turma"}), 409
     
     schedule = Schedule(
         user_id=user_id,
         turma_id=turma_id,
-        semana=data.get("semana", max_semana + 1),
+        semana=semana,
         atividades=data.get("atividades", ""),
         unidade_curricular=data.get("unidadeCurricular", ""),
         capacidades=data.get("capacidades", ""),
         conhecimentos=data.get("conhecimentos", ""),
-        recursos=data.get("recursos", "")
+        recursos=data.get("recursos", ""),
+        revision=revision
     )
+    schedule.update_capacidade_counters()
     
-    db.session.add(schedule)
-    db.session.commit()
+    try:
+        db.session.add(schedule)
+        refresh_turma_counters([turma_id], revision=revision)
+        db.session.commit()
+    except IntegrityError:
+        # uq_schedules_turma_semana: an import committed the same week after our check
+        db.session.rollback()
+        return jsonify({"error": f"A semana {semana} ja existe nesta turma"}), 409
     
     return jsonify(schedule.to_dict()), 201
 
@@ -953,6 +1451,8 @@ def add_week():
 @login_required
 def update_week(week_id):
     from models import Schedule
+    from stats import refresh_turma_counters
+    from sync import next_revision
     
     user_id = session['user_id']
     data = request.get_json()
@@ -967,10 +1467,13 @@ def update_week(week_id):
     
     schedule.atividades = data.get("atividades", schedule.atividades)
     schedule.unidade_curricular = data.get("unidadeCurricular", schedule.unidade_curricular)
-    schedule.capacidades = data.get("capacidades", schedule.capacidades)
+    schedule.set_capacidades(data.get("capacidades", schedule.capacidades))
     schedule.conhecimentos = data.get("conhecimentos", schedule.conhecimentos)
     schedule.recursos = data.get("recursos", schedule.recursos)
+    schedule.update_capacidade_counters()
+    schedule.revision = next_revision(user_id)
     
+    refresh_turma_counters([schedule.turma_id], revision=schedule.revision)
     db.session.commit()
     
     return jsonify(schedule.to_dict())
@@ -980,6 +1483,8 @@ def update_week(week_id):
 @login_required
 def delete_week(week_id):
     from models import Schedule
+    from stats import refresh_turma_counters
+    from sync import next_revision, record_deleted_schedules
     
     user_id = session['user_id']
     schedule = Schedule.query.filter_by(id=week_id, user_id=user_id).first()
@@ -987,89 +1492,313 @@ def delete_week(week_id):
     if not schedule:
         return jsonify({"error": "Semana nao encontrada"}), 404
     
+    turma_id = schedule.turma_id
+    revision = next_revision(user_id)
+    record_deleted_schedules(user_id, [week_id], revision)
     db.session.delete(schedule)
+    refresh_turma_counters([turma_id], revision=revision)
     db.session.commit()
     
     return jsonify({"message": "Semana excluida com sucesso"})
 
 
+def _toggle_target(data):
+    """Target state from the request body: True/False sets it, absent toggles it"""
+    completed = data.get("completed")
+    if completed is not None and not isinstance(completed, bool):
+        raise ValueError("O campo 'completed' deve ser true ou false")
+    return completed
+
+
+def _capacidades_mask_values(index, completed=None):
+    """SET values that mark, unmark or toggle one capacidade bit inside a single UPDATE.
+
+    capacidades_done moves by the same step, computed from the old mask like
+    the new one, so both stay consistent under concurrent clicks.
+    """
+    from models import Schedule
+    
+    mask = db.func.coalesce(Schedule.__table__.c.capacidades_mask, 0)
+    done = db.func.coalesce(Schedule.__table__.c.capacidades_done, 0)
+    bit = db.literal(1 << index, db.BigInteger)
+    marcada = mask.op('&')(bit) != 0
+    
+    if completed is None:
+        return {
+            "capacidades_mask": mask + db.case((marcada, -bit), else_=bit),
+            "capacidades_done": done + db.case((marcada, -1), else_=1),
+        }
+    if completed:
+        return {
+            "capacidades_mask": mask.op('|')(bit),
+            "capacidades_done": done + db.case((marcada, 0), else_=1),
+        }
+    return {
+        "capacidades_mask": mask - mask.op('&')(bit),
+        "capacidades_done": done - db.case((marcada, 1), else_=0),
+    }
+
+
+def _turma_returning_columns():
+    """turma_nome/turma_cor as scalar subqueries, so a schedules UPDATE ... RETURNING can feed Schedule.row_to_dict"""
+    from models import Schedule, Turma
+    
+    da_semana = Turma.id == Schedule.__table__.c.turma_id
+    return (
+        db.select(Turma.nome).where(da_semana).scalar_subquery().label("turma_nome"),
+        db.select(Turma.cor).where(da_semana).scalar_subquery().label("turma_cor"),
+    )
+
+
 @app.route("/api/weeks/<int:week_id>/toggle-complete", methods=["POST"])
 @login_required
 def toggle_week_complete(week_id):
     from models import Schedule
+    from stats import refresh_turma_counters
+    from sync import next_revision
     
     user_id = session['user_id']
-    schedule = Schedule.query.filter_by(id=week_id, user_id=user_id).first()
+    data = request.get_json(silent=True) or {}
     
-    if not schedule:
+    try:
+        completed = _toggle_target(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    revision = next_revision(user_id)
+    schedules = Schedule.__table__
+    novo = db.not_(db.func.coalesce(schedules.c.completed, False)) if completed is None else completed
+    row = db.session.execute(
+        schedules.update().where(schedules.c.id == week_id, schedules.c.user_id == user_id)
+        .values(completed=novo, revision=revision)
+        .returning(*schedules.c, *_turma_returning_columns())
+    ).first()
+    
+    if not row:
         return jsonify({"error": "Semana nao encontrada"}), 404
     
-    schedule.completed = not schedule.completed
+    refresh_turma_counters([row.turma_id], revision=revision)
     db.session.commit()
     
-    return jsonify(schedule.to_dict())
+    return jsonify(Schedule.row_to_dict(row, row.turma_nome, row.turma_cor))
 
 
 @app.route("/api/weeks/<int:week_id>/toggle-capacidade", methods=["POST"])
 @login_required
 def toggle_capacidade(week_id):
-    from models import Schedule
+    from models import Schedule, CAPACIDADES_MASK_BITS, capacidades_mask_indices
+    from stats import refresh_turma_counters
+    from sync import next_revision
     
     user_id = session['user_id']
-    schedule = Schedule.query.filter_by(id=week_id, user_id=user_id).first()
+    data = request.get_json(silent=True) or {}
     
-    if not schedule:
-        return jsonify({"error": "Semana nao encontrada"}), 404
-    
-    data = request.get_json()
     capacidade_index = data.get("index")
     
     if capacidade_index is None:
         return jsonify({"error": "Indice da capacidade nao informado"}), 400
     
-    completed_list = schedule.capacidades_completed.split(',') if schedule.capacidades_completed else []
-    completed_list = [x for x in completed_list if x]
+    try:
+        if isinstance(capacidade_index, bool):
+            raise ValueError
+        capacidade_index = int(capacidade_index)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Indice da capacidade invalido"}), 400
+    
+    if not 0 <= capacidade_index < CAPACIDADES_MASK_BITS:
+        return jsonify({"error": "Indice da capacidade invalido"}), 400
     
-    index_str = str(capacidade_index)
-    if index_str in completed_list:
-        completed_list.remove(index_str)
-    else:
-        completed_list.append(index_str)
+    try:
+        completed = _toggle_target(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    revision = next_revision(user_id)
+    schedules = Schedule.__table__
+    row = db.session.execute(
+        schedules.update().where(
+            schedules.c.id == week_id,
+            schedules.c.user_id == user_id,
+            schedules.c.capacidades_total > capacidade_index
+        )
+        .values(revision=revision, **_capacidades_mask_values(capacidade_index, completed))
+        .returning(schedules.c.id, schedules.c.turma_id, schedules.c.capacidades_mask)
+    ).first()
+    
+    if not row:
+        # Only reached on errors: tell an out-of-range index apart from a missing week
+        if db.session.query(Schedule.id).filter_by(id=week_id, user_id=user_id).first():
+            return jsonify({"error": "Indice da capacidade invalido"}), 400
+        return jsonify({"error": "Semana nao encontrada"}), 404
+    
+    refresh_turma_counters([row.turma_id], revision=revision)
+    db.session.commit()
+    
+    return jsonify({
+        "id": row.id,
+        "capacidades_completed": ','.join(str(i) for i in capacidades_mask_indices(row.capacidades_mask))
+    })
+
+
+WEEKS_BATCH_MAX = 500
+WEEKS_BATCH_OPS = {"update", "complete", "capacidades", "delete"}
+WEEK_FIELDS = {
+    "atividades": "atividades",
+    "unidadeCurricular": "unidade_curricular",
+    "capacidades": "capacidades",
+    "conhecimentos": "conhecimentos",
+    "recursos": "recursos",
+}
+WEEK_BATCH_COLUMNS = list(WEEK_FIELDS.values()) + [
+    "completed", "capacidades_mask", "capacidades_total", "capacidades_done"
+]
+
+
+def _apply_week_operation(semana, operacao):
+    """Applies one batch operation to the week's row dict; returns an error message or None"""
+    from models import CAPACIDADES_MASK_BITS, parse_capacidades, remap_capacidades_mask
+    
+    tipo = operacao["op"]
+    if tipo == "update":
+        campos = {key: value for key, value in operacao.items() if key in WEEK_FIELDS}
+        if not campos:
+            return "Nenhum campo para atualizar"
+        if not all(isinstance(value, str) for value in campos.values()):
+            return "Os campos da semana devem ser texto"
+        for key, value in campos.items():
+            column = WEEK_FIELDS[key]
+            if column == "capacidades" and value != semana["capacidades"]:
+                semana["capacidades_mask"] = remap_capacidades_mask(semana["capacidades"], value, semana["capacidades_mask"])
+            semana[column] = value
+    
+    elif tipo == "complete":
+        if not isinstance(operacao.get("completed"), bool):
+            return "O campo 'completed' deve ser true ou false"
+        semana["completed"] = operacao["completed"]
+    
+    elif tipo == "capacidades":
+        marcar = operacao.get("marcar", [])
+        desmarcar = operacao.get("desmarcar", [])
+        if not isinstance(marcar, list) or not isinstance(desmarcar, list) or not (marcar or desmarcar):
+            return "Informe as capacidades a marcar ou desmarcar"
+        # Same bound as the single toggle: indices past the mask width don't fit the BIGINT
+        total = min(len(parse_capacidades(semana["capacidades"])), CAPACIDADES_MASK_BITS)
+        for index in marcar + desmarcar:
+            if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < total:
+                return "Indice da capacidade invalido"
+        mask = semana["capacidades_mask"] or 0
+        for index in marcar:
+            mask |= 1 << index
+        for index in desmarcar:
+            mask &= ~(1 << index)
+        semana["capacidades_mask"] = mask
+    
+    return None
+
+
+@app.route("/api/weeks/batch", methods=["POST"])
+@login_required
+def batch_weeks():
+    from models import Schedule, parse_capacidades
+    from stats import refresh_turma_counters
+    from sync import next_revision, record_deleted_schedules
+    
+    user_id = session['user_id']
+    data = request.get_json(silent=True) or {}
+    operacoes = data.get("operations")
+    
+    if not isinstance(operacoes, list) or not operacoes:
+        return jsonify({"error": "Informe a lista de operacoes"}), 400
+    
+    if len(operacoes) > WEEKS_BATCH_MAX:
+        return jsonify({"error": f"Maximo de {WEEKS_BATCH_MAX} operacoes por lote"}), 400
+    
+    for i, operacao in enumerate(operacoes):
+        if (not isinstance(operacao, dict) or operacao.get("op") not in WEEKS_BATCH_OPS
+                or isinstance(operacao.get("id"), bool) or not isinstance(operacao.get("id"), int)):
+            return jsonify({"error": "Operacao invalida", "operacao": i}), 400
+    
+    revision = next_revision(user_id)
+    
+    # Lock every week the batch touches, so the read-modify-write below cannot lose a concurrent click
+    schedules = Schedule.__table__
+    rows = db.session.execute(
+        db.select(schedules.c.id, schedules.c.turma_id, *(schedules.c[column] for column in WEEK_BATCH_COLUMNS))
+        .where(schedules.c.id.in_({operacao["id"] for operacao in operacoes}), schedules.c.user_id == user_id)
+        .with_for_update()
+    ).mappings().all()
+    semanas = {row["id"]: dict(row) for row in rows}
+    turma_ids = {row["turma_id"] for row in rows}
+    
+    excluidas = []
+    alteradas = set()
+    for i, operacao in enumerate(operacoes):
+        semana = semanas.get(operacao["id"])
+        if semana is None:
+            if operacao["id"] in excluidas:
+                return jsonify({"error": f"A semana {operacao['id']} ja foi excluida neste lote", "operacao": i}), 400
+            return jsonify({"error": "Semana nao encontrada", "operacao": i}), 404
+        
+        erro = _apply_week_operation(semana, operacao)
+        if erro:
+            return jsonify({"error": erro, "operacao": i}), 400
+        
+        if operacao["op"] == "delete":
+            del semanas[operacao["id"]]
+            excluidas.append(operacao["id"])
+            alteradas.discard(operacao["id"])
+        else:
+            alteradas.add(operacao["id"])
+    
+    if excluidas:
+        record_deleted_schedules(user_id, excluidas, revision)
+        db.session.execute(schedules.delete().where(schedules.c.id.in_(excluidas)))
+    
+    if alteradas:
+        for schedule_id in alteradas:
+            semana = semanas[schedule_id]
+            semana["capacidades_total"] = len(parse_capacidades(semana["capacidades"]))
+            semana["capacidades_done"] = (semana["capacidades_mask"] or 0).bit_count()
+        db.session.execute(
+            schedules.update().where(schedules.c.id == db.bindparam("b_id")).values(revision=revision, **{
+                column: db.bindparam(f"b_{column}") for column in WEEK_BATCH_COLUMNS
+            }),
+            [
+                {"b_id": schedule_id, **{f"b_{column}": semanas[schedule_id][column] for column in WEEK_BATCH_COLUMNS}}
+                for schedule_id in alteradas
+            ]
+        )
     
-    schedule.capacidades_completed = ','.join(completed_list)
+    refresh_turma_counters(turma_ids, revision=revision)
     db.session.commit()
     
+    resultado = Schedule.query_with_turma().filter(Schedule.id.in_(alteradas)).order_by(
+        Schedule.turma_id, Schedule.semana
+    ).all() if alteradas else []
+    
     return jsonify({
-        "id": schedule.id,
-        "capacidades_completed": schedule.capacidades_completed
+        "message": f"{len(operacoes)} operacao(oes) aplicada(s)",
+        "semanas": [schedule.to_dict() for schedule in resultado],
+        "excluidas": excluidas
     })
 
 
 @app.route("/api/turmas/progress", methods=["GET"])
 @login_required
 def get_turmas_progress():
-    from models import Turma, Schedule
+    from models import Turma
+    from stats import turma_progress
     
     user_id = session['user_id']
     turmas = Turma.query.filter_by(user_id=user_id, active=True, concluida=False).all()
     
     progress_data = []
     for turma in turmas:
-        schedules = Schedule.query.filter_by(user_id=user_id, turma_id=turma.id).all()
-        
-        total_weeks = len(schedules)
-        completed_weeks = sum(1 for s in schedules if s.completed)
-        
-        total_capacidades = 0
-        completed_capacidades = 0
-        
-        for s in schedules:
-            caps = [c.strip() for c in s.capacidades.split('\n') if c.strip()]
-            total_capacidades += len(caps)
-            
-            completed_list = s.capacidades_completed.split(',') if s.capacidades_completed else []
-            completed_list = [x for x in completed_list if x]
-            completed_capacidades += len(completed_list)
+        stats = turma_progress(turma)
+        total_weeks = stats['total_weeks']
+        completed_weeks = stats['completed_weeks']
+        total_capacidades = stats['total_capacidades']
+        completed_capacidades = stats['completed_capacidades']
         
         weeks_percent = round((completed_weeks / total_weeks * 100) if total_weeks > 0 else 0)
         caps_percent = round((completed_capacidades / total_capacidades * 100) if total_capacidades > 0 else 0)
@@ -1151,770 +1880,286 @@ def run_migration():
 @login_required
 def export_json():
     from models import Schedule
+    import textwrap
     
     user_id = session['user_id']
-    schedules = Schedule.query.filter_by(user_id=user_id).order_by(Schedule.semana).all()
-    weeks = [s.to_dict() for s in schedules]
+    turma_id = request.args.get('turma_id', type=int)
+    ndjson = request.args.get('format') == 'ndjson'
     
-    response = Response(
-        json.dumps(weeks, ensure_ascii=False, indent=2),
+    query = Schedule.query_with_turma().filter_by(user_id=user_id)
+    if turma_id:
+        query = query.filter_by(turma_id=turma_id)
+    schedules = query.order_by(Schedule.semana, Schedule.id).yield_per(500)
+    
+    def generate_ndjson():
+        for schedule in schedules:
+            yield json.dumps(schedule.to_dict(), ensure_ascii=False) + "\n"
+    
+    def generate_json():
+        first = True
+        for schedule in schedules:
+            item = textwrap.indent(json.dumps(schedule.to_dict(), ensure_ascii=False, indent=2), "  ")
+            yield ("[\n" if first else ",\n") + item
+            first = False
+        yield "[]" if first else "\n]"
+    
+    if ndjson:
+        return Response(
+            stream_with_context(generate_ndjson()),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": "attachment;filename=cronograma.ndjson"}
+        )
+    
+    return Response(
+        stream_with_context(generate_json()),
         mimetype="application/json",
         headers={"Content-Disposition": "attachment;filename=cronograma.json"}
     )
-    return response
 
 
-@app.route("/api/export/pdf")
-@login_required
-def export_pdf():
-    from models import Schedule, Turma
-    from datetime import datetime
+def _send_cached_report(export_format):
+    """Serves the report from the cache; on a miss queues an export job.
+
+    API clients get 202 with the job status; browsers are redirected to /exportar/<job_id>.
+    """
+    from report_cache import find_report
+    from reports import PDF_MIMETYPE, XLSX_MIMETYPE
+    from jobs import submit_export_job as enqueue_export_job
     
     user_id = session['user_id']
     turma_id = request.args.get('turma_id', type=int)
-    
-    query = Schedule.query.filter_by(user_id=user_id)
-    if turma_id:
-        query = query.filter_by(turma_id=turma_id)
-    
-    schedules = query.order_by(Schedule.semana).all()
-    weeks = [s.to_dict() for s in schedules]
-    
-    turma = None
-    if turma_id:
-        turma = Turma.query.filter_by(id=turma_id, user_id=user_id).first()
-    
-    all_capacidades_desenvolvidas = []
-    total_capacidades = 0
-    total_completed = 0
-    completed_weeks = 0
-    
-    for week in weeks:
-        if week.get('completed'):
-            completed_weeks += 1
-        
-        caps = [c.strip() for c in week.get('capacidades', '').split('\n') if c.strip()]
-        completed_list = week.get('capacidades_completed', '').split(',') if week.get('capacidades_completed') else []
-        completed_list = [x for x in completed_list if x]
-        
-        total_capacidades += len(caps)
-        total_completed += len(completed_list)
-        
-        for idx, cap in enumerate(caps):
-            is_completed = str(idx) in completed_list
-            if is_completed:
-                all_capacidades_desenvolvidas.append({
-                    'semana': week['semana'],
-                    'capacidade': cap,
-                    'unidade': week.get('unidadeCurricular', '')
-                })
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=landscape(A4),
-        rightMargin=1*cm,
-        leftMargin=1*cm,
-        topMargin=1*cm,
-        bottomMargin=1*cm
-    )
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=10,
-        alignment=1
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Normal'],
-        fontSize=12,
-        spaceAfter=5,
-        alignment=1,
-        textColor=colors.HexColor('#4B5563')
-    )
-    
-    info_style = ParagraphStyle(
-        'InfoStyle',
-        parent=styles['Normal'],
-        fontSize=9,
-        spaceAfter=3,
-        textColor=colors.HexColor('#374151')
-    )
-    
-    cell_style = ParagraphStyle(
-        'CellStyle',
-        parent=styles['Normal'],
-        fontSize=7,
-        leading=9
-    )
-    
-    cell_completed_style = ParagraphStyle(
-        'CellCompletedStyle',
-        parent=styles['Normal'],
-        fontSize=7,
-        leading=9,
-        textColor=colors.HexColor('#059669')
-    )
-    
-    section_title_style = ParagraphStyle(
-        'SectionTitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceBefore=20,
-        spaceAfter=10,
-        textColor=colors.HexColor('#059669')
-    )
-    
-    if turma:
-        elements.append(Paragraph(f"Cronograma - {turma.nome}", title_style))
-        if turma.descricao:
-            elements.append(Paragraph(turma.descricao, subtitle_style))
-        elements.append(Spacer(1, 10))
-        
-        info_items = []
-        if turma.carga_horaria:
-            info_items.append(f"<b>Carga Horaria:</b> {turma.carga_horaria}h")
-        if turma.dias_aula:
-            info_items.append(f"<b>Dias de Aula:</b> {turma.dias_aula}")
-        if turma.horario_inicio and turma.horario_fim:
-            info_items.append(f"<b>Horario:</b> {turma.horario_inicio} - {turma.horario_fim}")
-        elif turma.horario_inicio:
-            info_items.append(f"<b>Horario:</b> {turma.horario_inicio}")
-        
-        if turma.data_inicio or turma.data_fim:
-            data_inicio_str = turma.data_inicio.strftime('%d/%m/%Y') if turma.data_inicio else '-'
-            data_fim_str = turma.data_fim.strftime('%d/%m/%Y') if turma.data_fim else '-'
-            info_items.append(f"<b>Periodo:</b> {data_inicio_str} a {data_fim_str}")
-        
-        if info_items:
-            info_text = " &nbsp;&nbsp;|&nbsp;&nbsp; ".join(info_items)
-            elements.append(Paragraph(info_text, info_style))
-            elements.append(Spacer(1, 10))
-    else:
-        elements.append(Paragraph("Aula Planner Pro - Cronograma Completo", title_style))
-        elements.append(Spacer(1, 10))
-    
-    progress_percent_weeks = round((completed_weeks / len(weeks) * 100) if len(weeks) > 0 else 0)
-    progress_percent_caps = round((total_completed / total_capacidades * 100) if total_capacidades > 0 else 0)
-    
-    progress_text = f"<b>Progresso:</b> {completed_weeks}/{len(weeks)} semanas concluidas ({progress_percent_weeks}%) | {total_completed}/{total_capacidades} capacidades desenvolvidas ({progress_percent_caps}%)"
-    elements.append(Paragraph(progress_text, info_style))
-    elements.append(Spacer(1, 15))
-    
-    headers = ["Status", "Semana", "Atividades", "Unidade Curricular", "Capacidades", "Conhecimentos", "Recursos"]
-    
-    if not turma_id:
-        headers.insert(2, "Turma")
-    
-    data = [headers]
-    for week in weeks:
-        status = "Concluida" if week.get('completed') else "Pendente"
-        
-        caps = [c.strip() for c in week.get('capacidades', '').split('\n') if c.strip()]
-        completed_list = week.get('capacidades_completed', '').split(',') if week.get('capacidades_completed') else []
-        completed_list = [x for x in completed_list if x]
-        
-        capacidades_formatted = []
-        for idx, cap in enumerate(caps):
-            if str(idx) in completed_list:
-                capacidades_formatted.append(f"[OK] {cap}")
-            else:
-                capacidades_formatted.append(f"[ ] {cap}")
-        
-        capacidades_text = "\n".join(capacidades_formatted) if capacidades_formatted else week.get('capacidades', '')
-        
-        if turma_id:
-            row = [
-                status,
-                str(week["semana"]),
-                Paragraph(week["atividades"], cell_style),
-                Paragraph(week["unidadeCurricular"], cell_style),
-                Paragraph(capacidades_text.replace('\n', '<br/>'), cell_completed_style if week.get('completed') else cell_style),
-                Paragraph(week["conhecimentos"], cell_style),
-                Paragraph(week["recursos"], cell_style)
-            ]
-        else:
-            row = [
-                status,
-                str(week["semana"]),
-                Paragraph(week.get("turma_nome", ""), cell_style),
-                Paragraph(week["atividades"], cell_style),
-                Paragraph(week["unidadeCurricular"], cell_style),
-                Paragraph(capacidades_text.replace('\n', '<br/>'), cell_completed_style if week.get('completed') else cell_style),
-                Paragraph(week["conhecimentos"], cell_style),
-                Paragraph(week["recursos"], cell_style)
-            ]
-        data.append(row)
-    
-    if turma_id:
-        col_widths = [1.5*cm, 1.2*cm, 4.5*cm, 3.5*cm, 5.5*cm, 4*cm, 3.5*cm]
+    mimetype = PDF_MIMETYPE if export_format == 'pdf' else XLSX_MIMETYPE
+    path, filename, key, turma = find_report(user_id, turma_id, export_format)
+    
+    if not path:
+        if turma_id and not turma:
+            return jsonify({"error": "Turma nao encontrada"}), 404
+        job = enqueue_export_job(app, user_id, export_format, turma_id)
+        if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html':
+            # Bookmarks and direct links: a page that waits for the job and then starts the download
+            return redirect(url_for('exportar_page', job_id=job['id']))
+        status = _export_job_status(job)
+        return jsonify(status), 202, {'Location': status["status_url"]}
+    
+    if key in request.if_none_match:
+        response = Response(status=304)
     else:
-        col_widths = [1.3*cm, 1*cm, 2.5*cm, 4*cm, 3*cm, 5*cm, 3.5*cm, 3*cm]
-    
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-    
-    table_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3B82F6')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('TOPPADDING', (0, 0), (-1, 0), 8),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E5E7EB')),
-        ('LEFTPADDING', (0, 0), (-1, -1), 4),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]
-    
-    for idx, week in enumerate(weeks, 1):
-        if week.get('completed'):
-            table_style.append(('BACKGROUND', (0, idx), (-1, idx), colors.HexColor('#D1FAE5')))
-            table_style.append(('TEXTCOLOR', (0, idx), (0, idx), colors.HexColor('#059669')))
-    
-    table.setStyle(TableStyle(table_style))
-    elements.append(table)
-    
-    if all_capacidades_desenvolvidas:
-        elements.append(Spacer(1, 30))
-        elements.append(Paragraph("Capacidades Desenvolvidas", section_title_style))
-        elements.append(Spacer(1, 10))
-        
-        summary_info = f"Total de {len(all_capacidades_desenvolvidas)} capacidades desenvolvidas ao longo do curso."
-        elements.append(Paragraph(summary_info, info_style))
-        elements.append(Spacer(1, 10))
-        
-        caps_headers = ["Semana", "Unidade Curricular", "Capacidade Desenvolvida"]
-        caps_data = [caps_headers]
-        
-        for cap_info in all_capacidades_desenvolvidas:
-            caps_data.append([
-                str(cap_info['semana']),
-                Paragraph(cap_info['unidade'], cell_style),
-                Paragraph(cap_info['capacidade'], cell_style)
-            ])
-        
-        caps_col_widths = [2*cm, 6*cm, 18*cm]
-        caps_table = Table(caps_data, colWidths=caps_col_widths, repeatRows=1)
-        caps_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#059669')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('TOPPADDING', (0, 0), (-1, 0), 8),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E5E7EB')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#ECFDF5')]),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-        ]))
-        elements.append(caps_table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
-    filename = f"cronograma_{turma.nome.replace(' ', '_')}.pdf" if turma else "cronograma.pdf"
-    
-    return send_file(
-        buffer,
-        mimetype='application/pdf',
-        as_attachment=True,
-        download_name=filename
-    )
+        response = send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=True, download_name=filename, conditional=False, etag=False)
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@app.route("/api/export/pdf")
+@login_required
+def export_pdf():
+    return _send_cached_report('pdf')
 
 
 @app.route("/api/export/xlsx")
 @login_required
 def export_xlsx():
-    from models import Schedule, Turma
-    from datetime import datetime
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils import get_column_letter
+    return _send_cached_report('xlsx')
+
+
+def _export_job_status(job):
+    status = {
+        "id": job['id'],
+        "format": job['format'],
+        "turma_id": job['turma_id'],
+        "status": job['status'],
+        "error": job['error'],
+        "status_url": url_for('get_export_job', job_id=job['id'])
+    }
+    if job['status'] == 'done':
+        status["download_url"] = url_for('download_export_job', job_id=job['id'])
+    return status
+
+
+@app.route("/api/export/jobs", methods=["POST"])
+@login_required
+def submit_export_job():
+    from models import Turma
+    from jobs import submit_export_job as enqueue_export_job, EXPORT_FORMATS
     
     user_id = session['user_id']
-    turma_id = request.args.get('turma_id', type=int)
-    
-    query = Schedule.query.filter_by(user_id=user_id)
-    if turma_id:
-        query = query.filter_by(turma_id=turma_id)
+    data = request.get_json() or {}
     
-    schedules = query.order_by(Schedule.semana).all()
-    weeks = [s.to_dict() for s in schedules]
+    export_format = data.get("format", "")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Formato de exportacao invalido. Use pdf ou xlsx."}), 400
     
-    turma = None
+    turma_id = data.get("turma_id") or None
+    if turma_id is not None and (isinstance(turma_id, bool) or not isinstance(turma_id, int)):
+        return jsonify({"error": "Turma invalida"}), 400
     if turma_id:
         turma = Turma.query.filter_by(id=turma_id, user_id=user_id).first()
+        if not turma:
+            return jsonify({"error": "Turma nao encontrada"}), 404
+        turma_id = turma.id
     
-    all_capacidades_desenvolvidas = []
-    total_capacidades = 0
-    total_completed = 0
-    completed_weeks = 0
-    
-    for week in weeks:
-        if week.get('completed'):
-            completed_weeks += 1
-        
-        caps = [c.strip() for c in week.get('capacidades', '').split('\n') if c.strip()]
-        completed_list = week.get('capacidades_completed', '').split(',') if week.get('capacidades_completed') else []
-        completed_list = [x for x in completed_list if x]
-        
-        total_capacidades += len(caps)
-        total_completed += len(completed_list)
-        
-        for idx, cap in enumerate(caps):
-            is_completed = str(idx) in completed_list
-            if is_completed:
-                all_capacidades_desenvolvidas.append({
-                    'semana': week['semana'],
-                    'capacidade': cap,
-                    'unidade': week.get('unidadeCurricular', '')
-                })
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Cronograma"
-    
-    header_font = Font(bold=True, color="FFFFFF", size=11)
-    header_fill = PatternFill(start_color="3B82F6", end_color="3B82F6", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    
-    cell_alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
-    center_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    thin_border = Border(
-        left=Side(style='thin', color='E5E7EB'),
-        right=Side(style='thin', color='E5E7EB'),
-        top=Side(style='thin', color='E5E7EB'),
-        bottom=Side(style='thin', color='E5E7EB')
-    )
-    
-    completed_fill = PatternFill(start_color="D1FAE5", end_color="D1FAE5", fill_type="solid")
-    completed_font = Font(color="059669")
-    green_header_fill = PatternFill(start_color="059669", end_color="059669", fill_type="solid")
-    
-    current_row = 1
-    
-    if turma:
-        ws.merge_cells(f'A{current_row}:H{current_row}')
-        title_cell = ws.cell(row=current_row, column=1, value=f"Cronograma - {turma.nome}")
-        title_cell.font = Font(bold=True, size=16)
-        title_cell.alignment = Alignment(horizontal="center")
-        current_row += 1
-        
-        if turma.descricao:
-            ws.merge_cells(f'A{current_row}:H{current_row}')
-            desc_cell = ws.cell(row=current_row, column=1, value=turma.descricao)
-            desc_cell.alignment = Alignment(horizontal="center")
-            current_row += 1
-        
-        info_parts = []
-        if turma.carga_horaria:
-            info_parts.append(f"Carga Horaria: {turma.carga_horaria}h")
-        if turma.dias_aula:
-            info_parts.append(f"Dias de Aula: {turma.dias_aula}")
-        if turma.horario_inicio and turma.horario_fim:
-            info_parts.append(f"Horario: {turma.horario_inicio} - {turma.horario_fim}")
-        if turma.data_inicio or turma.data_fim:
-            data_inicio_str = turma.data_inicio.strftime('%d/%m/%Y') if turma.data_inicio else '-'
-            data_fim_str = turma.data_fim.strftime('%d/%m/%Y') if turma.data_fim else '-'
-            info_parts.append(f"Periodo: {data_inicio_str} a {data_fim_str}")
-        
-        if info_parts:
-            ws.merge_cells(f'A{current_row}:H{current_row}')
-            info_cell = ws.cell(row=current_row, column=1, value=" | ".join(info_parts))
-            info_cell.alignment = Alignment(horizontal="center")
-            current_row += 1
-        
-        current_row += 1
-    else:
-        ws.merge_cells(f'A{current_row}:H{current_row}')
-        title_cell = ws.cell(row=current_row, column=1, value="Aula Planner Pro - Cronograma Completo")
-        title_cell.font = Font(bold=True, size=16)
-        title_cell.alignment = Alignment(horizontal="center")
-        current_row += 2
-    
-    progress_percent_weeks = round((completed_weeks / len(weeks) * 100) if len(weeks) > 0 else 0)
-    progress_percent_caps = round((total_completed / total_capacidades * 100) if total_capacidades > 0 else 0)
-    
-    ws.merge_cells(f'A{current_row}:H{current_row}')
-    progress_cell = ws.cell(row=current_row, column=1, 
-                            value=f"Progresso: {completed_weeks}/{len(weeks)} semanas concluidas ({progress_percent_weeks}%) | {total_completed}/{total_capacidades} capacidades desenvolvidas ({progress_percent_caps}%)")
-    progress_cell.font = Font(bold=True, color="059669")
-    progress_cell.alignment = Alignment(horizontal="center")
-    current_row += 2
-    
-    if turma_id:
-        headers = ["Status", "Semana", "Atividades", "Unidade Curricular", "Capacidades", "Conhecimentos", "Recursos"]
-    else:
-        headers = ["Status", "Semana", "Turma", "Atividades", "Unidade Curricular", "Capacidades", "Conhecimentos", "Recursos"]
-    
-    header_row = current_row
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=current_row, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-    
-    current_row += 1
+    job = enqueue_export_job(app, user_id, export_format, turma_id)
+    return jsonify(_export_job_status(job)), 202
+
+
+@app.route("/api/export/jobs/<job_id>", methods=["GET"])
+@login_required
+def get_export_job(job_id):
+    from jobs import get_job
     
-    for week in weeks:
-        status = "Concluida" if week.get('completed') else "Pendente"
-        
-        caps = [c.strip() for c in week.get('capacidades', '').split('\n') if c.strip()]
-        completed_list = week.get('capacidades_completed', '').split(',') if week.get('capacidades_completed') else []
-        completed_list = [x for x in completed_list if x]
-        
-        capacidades_formatted = []
-        for idx, cap in enumerate(caps):
-            if str(idx) in completed_list:
-                capacidades_formatted.append(f"[OK] {cap}")
-            else:
-                capacidades_formatted.append(f"[ ] {cap}")
-        
-        capacidades_text = "\n".join(capacidades_formatted) if capacidades_formatted else week.get('capacidades', '')
-        
-        if turma_id:
-            row_data = [
-                status,
-                week["semana"],
-                week["atividades"],
-                week["unidadeCurricular"],
-                capacidades_text,
-                week["conhecimentos"],
-                week["recursos"]
-            ]
-        else:
-            row_data = [
-                status,
-                week["semana"],
-                week.get("turma_nome", ""),
-                week["atividades"],
-                week["unidadeCurricular"],
-                capacidades_text,
-                week["conhecimentos"],
-                week["recursos"]
-            ]
-        
-        for col, value in enumerate(row_data, 1):
-            cell = ws.cell(row=current_row, column=col, value=value)
-            cell.alignment = cell_alignment if col > 2 else center_alignment
-            cell.border = thin_border
-            
-            if week.get('completed'):
-                cell.fill = completed_fill
-                if col == 1:
-                    cell.font = completed_font
-        
-        current_row += 1
+    job = get_job(job_id)
+    if not job or job['user_id'] != session['user_id']:
+        return jsonify({"error": "Exportacao nao encontrada"}), 404
     
-    if turma_id:
-        col_widths = [12, 10, 40, 25, 40, 30, 25]
-    else:
-        col_widths = [12, 10, 20, 35, 22, 35, 25, 22]
+    return jsonify(_export_job_status(job))
+
+
+@app.route("/exportar/<job_id>")
+@login_required
+def exportar_page(job_id):
+    from jobs import get_job
     
-    for i, width in enumerate(col_widths, 1):
-        ws.column_dimensions[get_column_letter(i)].width = width
+    job = get_job(job_id)
+    if not job or job['user_id'] != session['user_id']:
+        return jsonify({"error": "Exportacao nao encontrada"}), 404
     
-    if all_capacidades_desenvolvidas:
-        ws_caps = wb.create_sheet(title="Capacidades Desenvolvidas")
-        
-        ws_caps.merge_cells('A1:C1')
-        title_cell = ws_caps.cell(row=1, column=1, value="Capacidades Desenvolvidas")
-        title_cell.font = Font(bold=True, size=16, color="059669")
-        title_cell.alignment = Alignment(horizontal="center")
-        
-        ws_caps.merge_cells('A2:C2')
-        summary_cell = ws_caps.cell(row=2, column=1, 
-                                    value=f"Total de {len(all_capacidades_desenvolvidas)} capacidades desenvolvidas ao longo do curso")
-        summary_cell.alignment = Alignment(horizontal="center")
-        
-        caps_headers = ["Semana", "Unidade Curricular", "Capacidade Desenvolvida"]
-        for col, header in enumerate(caps_headers, 1):
-            cell = ws_caps.cell(row=4, column=col, value=header)
-            cell.font = header_font
-            cell.fill = green_header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        caps_row = 5
-        for cap_info in all_capacidades_desenvolvidas:
-            ws_caps.cell(row=caps_row, column=1, value=cap_info['semana']).alignment = center_alignment
-            ws_caps.cell(row=caps_row, column=1).border = thin_border
-            
-            ws_caps.cell(row=caps_row, column=2, value=cap_info['unidade']).alignment = cell_alignment
-            ws_caps.cell(row=caps_row, column=2).border = thin_border
-            
-            ws_caps.cell(row=caps_row, column=3, value=cap_info['capacidade']).alignment = cell_alignment
-            ws_caps.cell(row=caps_row, column=3).border = thin_border
-            
-            if caps_row % 2 == 0:
-                for col in range(1, 4):
-                    ws_caps.cell(row=caps_row, column=col).fill = PatternFill(start_color="ECFDF5", end_color="ECFDF5", fill_type="solid")
-            
-            caps_row += 1
-        
-        ws_caps.column_dimensions['A'].width = 10
-        ws_caps.column_dimensions['B'].width = 30
-        ws_caps.column_dimensions['C'].width = 80
+    return render_template("exportar.html", status_url=url_for('get_export_job', job_id=job['id']))
+
+
+@app.route("/api/export/jobs/<job_id>/download", methods=["GET"])
+@login_required
+def download_export_job(job_id):
+    from jobs import get_job, job_file_path, job_mimetype
     
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    job = get_job(job_id)
+    if not job or job['user_id'] != session['user_id']:
+        return jsonify({"error": "Exportacao nao encontrada"}), 404
     
-    filename = f"cronograma_{turma.nome.replace(' ', '_')}.xlsx" if turma else "cronograma.xlsx"
+    if job['status'] != 'done' or not os.path.exists(job_file_path(job)):
+        return jsonify({"error": "Exportacao ainda nao concluida ou expirada"}), 409
     
     return send_file(
-        buffer,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        os.path.abspath(job_file_path(job)),
+        mimetype=job_mimetype(job),
         as_attachment=True,
-        download_name=filename
+        download_name=job['filename']
     )
 
 
 @app.route("/importar")
 @login_required
 def importar_page():
-    from models import User
-    user_data = User.query.get(session['user_id'])
-    has_photo = bool(user_data and user_data.photo_data)
-    return render_template("importar.html", user=session, user_id=session['user_id'], has_photo=has_photo)
+    user_data = current_user()
+    has_photo = bool(user_data and user_data.has_photo)
+    photo_version = user_data.photo_version if has_photo else ''
+    return render_template("importar.html", user=session, user_id=session['user_id'], has_photo=has_photo, photo_version=photo_version)
 
 
 @app.route("/api/cronograma/template")
 @login_required
 def download_template():
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils import get_column_letter
-    from openpyxl.worksheet.datavalidation import DataValidation
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Cronograma"
-    
-    header_font = Font(bold=True, color="FFFFFF", size=11)
-    header_fill = PatternFill(start_color="3B82F6", end_color="3B82F6", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    cell_alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
-    thin_border = Border(
-        left=Side(style='thin', color='E5E7EB'),
-        right=Side(style='thin', color='E5E7EB'),
-        top=Side(style='thin', color='E5E7EB'),
-        bottom=Side(style='thin', color='E5E7EB')
-    )
-    
-    ws.merge_cells('A1:G1')
-    title_cell = ws.cell(row=1, column=1, value="Template de Importacao de Cronograma")
-    title_cell.font = Font(bold=True, size=16, color="3B82F6")
-    title_cell.alignment = Alignment(horizontal="center")
-    
-    ws.merge_cells('A2:G2')
-    subtitle_cell = ws.cell(row=2, column=1, value="Preencha as informacoes abaixo e faca o upload para importar as semanas automaticamente")
-    subtitle_cell.font = Font(size=10, color="6B7280")
-    subtitle_cell.alignment = Alignment(horizontal="center")
-    
-    headers = [
-        "Semana",
-        "Atividades Praticas e Teoricas", 
-        "Unidade Curricular",
-        "Capacidades Desenvolvidas",
-        "Conhecimentos Trabalhados",
-        "Recursos"
-    ]
+    from reports import import_template, XLSX_MIMETYPE
     
-    header_row = 4
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=header_row, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-    
-    example_data = [
-        [1, "Apresentacao do curso e introducao aos conceitos basicos", "Fundamentos de Programacao", "Compreender os conceitos basicos de logica de programacao\nIdentificar estruturas de dados simples", "Algoritmos\nLogica de programacao\nVariaveis e tipos de dados", "Computador, Projetor, Material didatico"],
-        [2, "Pratica de algoritmos e estruturas de controle", "Fundamentos de Programacao", "Desenvolver algoritmos utilizando estruturas de controle\nAplicar estruturas de repeticao", "Estruturas condicionais\nLacos de repeticao\nFuncoes", "Laboratoro de informatica, IDE de programacao"],
-        [3, "Introducao a orientacao a objetos", "Programacao Orientada a Objetos", "Compreender os principios da POO\nImplementar classes e objetos", "Classes e objetos\nEncapsulamento\nHeranca", "Computador, Ambiente de desenvolvimento"],
-    ]
-    
-    for row_idx, row_data in enumerate(example_data, header_row + 1):
-        for col_idx, value in enumerate(row_data, 1):
-            cell = ws.cell(row=row_idx, column=col_idx, value=value)
-            cell.alignment = cell_alignment
-            cell.border = thin_border
-    
-    col_widths = [10, 50, 30, 50, 40, 35]
-    for i, width in enumerate(col_widths, 1):
-        ws.column_dimensions[get_column_letter(i)].width = width
-    
-    for row in range(header_row + 1, header_row + 51):
-        for col in range(1, 7):
-            cell = ws.cell(row=row, column=col)
-            cell.border = thin_border
-            cell.alignment = cell_alignment
-    
-    ws_instrucoes = wb.create_sheet(title="Instrucoes")
-    
-    instrucoes = [
-        ("Instrucoes de Preenchimento", True, 16),
-        ("", False, 11),
-        ("1. SEMANA: Numero da semana (obrigatorio). Deve ser um numero inteiro.", False, 11),
-        ("", False, 11),
-        ("2. ATIVIDADES PRATICAS E TEORICAS: Descricao das atividades da semana.", False, 11),
-        ("   Pode incluir tanto atividades praticas quanto teoricas.", False, 11),
-        ("", False, 11),
-        ("3. UNIDADE CURRICULAR: Nome da disciplina ou modulo.", False, 11),
-        ("", False, 11),
-        ("4. CAPACIDADES DESENVOLVIDAS: Liste as capacidades que serao desenvolvidas.", False, 11),
-        ("   Separe cada capacidade em uma linha diferente (pressione Alt+Enter para quebra de linha).", False, 11),
-        ("", False, 11),
-        ("5. CONHECIMENTOS TRABALHADOS: Liste os conhecimentos abordados.", False, 11),
-        ("   Separe cada conhecimento em uma linha diferente.", False, 11),
-        ("", False, 11),
-        ("6. RECURSOS: Materiais e recursos necessarios para a semana.", False, 11),
-        ("   Pode ser uma lista separada por virgulas.", False, 11),
-        ("", False, 11),
-        ("IMPORTANTE:", True, 12),
-        ("- A primeira linha de dados (linha 5) contem exemplos. Pode mante-los ou apaga-los.", False, 11),
-        ("- Nao altere os cabecalhos na linha 4.", False, 11),
-        ("- Semanas com numero duplicado serao ignoradas.", False, 11),
-        ("- Linhas sem numero de semana serao ignoradas.", False, 11),
-    ]
-    
-    for row_idx, (texto, negrito, tamanho) in enumerate(instrucoes, 1):
-        cell = ws_instrucoes.cell(row=row_idx, column=1, value=texto)
-        cell.font = Font(bold=negrito, size=tamanho, color="3B82F6" if negrito else "374151")
+    data, etag = import_template()
     
-    ws_instrucoes.column_dimensions['A'].width = 100
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    return send_file(
-        buffer,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name='template_cronograma.xlsx'
-    )
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = send_file(BytesIO(data), mimetype=XLSX_MIMETYPE, as_attachment=True, download_name='template_cronograma.xlsx', etag=False)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+def _import_prefers_json():
+    return request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json'
+
+
+def _import_error(mensagem, status=400):
+    if _import_prefers_json():
+        return jsonify({"error": mensagem}), status
+    flash(mensagem, "error")
+    return redirect(url_for('importar_page'))
+
+
+def _import_job_status(job):
+    status = {
+        "id": job['id'],
+        "turma_id": job['turma_id'],
+        "filename": job['filename'],
+        "modo": job['mode'],
+        "status": job['status'],
+        "error": job['error'],
+        "message": job['message'],
+        "processadas": job['processadas'],
+        "importadas": job['importadas'],
+        "atualizadas": job['atualizadas'],
+        "inalteradas": job['inalteradas'],
+        "ignoradas": job['ignoradas'],
+        "erros_count": job['erros_count'],
+        "status_url": url_for('get_import_job', job_id=job['id'])
+    }
+    if job['status'] == 'done':
+        status["erros"] = job['erros']
+    return status
 
 
 @app.route("/api/cronograma/importar", methods=["POST"])
 @login_required
 def importar_cronograma():
-    from models import Schedule, Turma
-    from openpyxl import load_workbook
+    from models import Turma
+    from importer import import_extension, IMPORT_MODES, IMPORT_MODE_IGNORE
+    from jobs import submit_import_job
     
     user_id = session['user_id']
     
     turma_id = request.form.get('turma_id', type=int)
     if not turma_id:
-        flash("Selecione uma turma para importar o cronograma.", "error")
-        return redirect(url_for('importar_page'))
+        return _import_error("Selecione uma turma para importar o cronograma.")
     
     turma = Turma.query.filter_by(id=turma_id, user_id=user_id, active=True).first()
     if not turma:
-        flash("Turma nao encontrada.", "error")
-        return redirect(url_for('importar_page'))
+        return _import_error("Turma nao encontrada.", 404)
     
     if 'arquivo' not in request.files:
-        flash("Nenhum arquivo enviado.", "error")
-        return redirect(url_for('importar_page'))
+        return _import_error("Nenhum arquivo enviado.")
     
     arquivo = request.files['arquivo']
     if arquivo.filename == '':
-        flash("Nenhum arquivo selecionado.", "error")
-        return redirect(url_for('importar_page'))
+        return _import_error("Nenhum arquivo selecionado.")
     
-    if not arquivo.filename.endswith(('.xlsx', '.xls')):
-        flash("Formato de arquivo invalido. Use arquivos .xlsx ou .xls", "error")
-        return redirect(url_for('importar_page'))
+    if not import_extension(arquivo.filename):
+        return _import_error("Formato de arquivo invalido. Use arquivos .xlsx, .csv ou .ndjson")
     
-    try:
-        wb = load_workbook(arquivo, data_only=True)
-        ws = wb.active
-        
-        semanas_existentes = set()
-        schedules_existentes = Schedule.query.filter_by(user_id=user_id, turma_id=turma_id).all()
-        for s in schedules_existentes:
-            semanas_existentes.add(s.semana)
-        
-        semanas_importadas = 0
-        semanas_ignoradas = 0
-        erros = []
-        
-        header_row = 4
-        for row_idx in range(header_row + 1, ws.max_row + 1):
-            semana_cell = ws.cell(row=row_idx, column=1).value
-            
-            if semana_cell is None or str(semana_cell).strip() == '':
-                continue
-            
-            try:
-                semana = int(semana_cell)
-            except (ValueError, TypeError):
-                erros.append(f"Linha {row_idx}: Numero de semana invalido '{semana_cell}'")
-                continue
-            
-            if semana in semanas_existentes:
-                semanas_ignoradas += 1
-                continue
-            
-            atividades = str(ws.cell(row=row_idx, column=2).value or '').strip()
-            unidade_curricular = str(ws.cell(row=row_idx, column=3).value or '').strip()
-            capacidades = str(ws.cell(row=row_idx, column=4).value or '').strip()
-            conhecimentos = str(ws.cell(row=row_idx, column=5).value or '').strip()
-            recursos = str(ws.cell(row=row_idx, column=6).value or '').strip()
-            
-            schedule = Schedule(
-                user_id=user_id,
-                turma_id=turma_id,
-                semana=semana,
-                atividades=atividades,
-                unidade_curricular=unidade_curricular,
-                capacidades=capacidades,
-                conhecimentos=conhecimentos,
-                recursos=recursos
-            )
-            db.session.add(schedule)
-            semanas_existentes.add(semana)
-            semanas_importadas += 1
-        
-        db.session.commit()
-        
-        mensagem = f"Importacao concluida! {semanas_importadas} semana(s) importada(s)"
-        if semanas_ignoradas > 0:
-            mensagem += f", {semanas_ignoradas} ignorada(s) por ja existirem"
-        if erros:
-            mensagem += f". {len(erros)} erro(s) encontrado(s)"
-        
-        flash(mensagem, "success" if semanas_importadas > 0 else "warning")
-        
-    except Exception as e:
-        db.session.rollback()
-        logging.error(f"Erro ao importar cronograma: {str(e)}")
-        flash(f"Erro ao processar arquivo: {str(e)}", "error")
+    modo = request.form.get('modo') or IMPORT_MODE_IGNORE
+    if modo not in IMPORT_MODES:
+        return _import_error("Modo de importacao invalido.")
     
-    return redirect(url_for('importar_page'))
+    job = submit_import_job(app, user_id, turma_id, arquivo, modo)
+    
+    if _import_prefers_json():
+        return jsonify(_import_job_status(job)), 202
+    
+    flash("Importacao iniciada! O progresso aparece abaixo.", "success")
+    return redirect(url_for('importar_page', job=job['id']))
+
+
+@app.route("/api/cronograma/importar/jobs/<job_id>", methods=["GET"])
+@login_required
+def get_import_job(job_id):
+    from jobs import get_import_job as load_import_job
+    
+    job = load_import_job(job_id)
+    if not job or job['user_id'] != session['user_id']:
+        return jsonify({"error": "Importacao nao encontrada"}), 404
+    
+    return jsonify(_import_job_status(job))
 
 
 @app.after_request
 def add_header(response):
+    if response.cache_control.public or response.cache_control.private:
+        return response
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
@@ -0,0 +1,38 @@
+"""Query count and latency of duplicating a 200-week turma, once and in batches.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_duplicar.py
+"""
+from common import app, count_queries, timed, create_bench_user, seed_turmas, drop_bench_user, logged_in_client
+
+WEEKS = 200
+BATCH_SIZES = [1, 10, 50]
+
+
+def main():
+    print(f"{'endpoint':<32} {'turmas':>7} {'queries':>8} {'ms':>9} {'server ms':>10}")
+    with app.app_context():
+        user_id = create_bench_user()
+        try:
+            turma_id = seed_turmas(user_id, 1, WEEKS)[0]
+            client = logged_in_client(user_id)
+
+            with count_queries() as counter, timed() as elapsed:
+                response = client.post(f"/api/turmas/{turma_id}/duplicar", json={"novo_nome": "Copia"})
+            assert response.status_code == 201, response.status_code
+            assert response.get_json()["schedules_copiados"] == WEEKS
+            print(f"{'/api/turmas/<id>/duplicar':<32} {1:>7} {counter.count:>8} {elapsed['ms']:>9.1f} {'':>10}")
+
+            for size in BATCH_SIZES:
+                nomes = [f"Copia {i + 1}" for i in range(size)]
+                with count_queries() as counter, timed() as elapsed:
+                    response = client.post(f"/api/turmas/{turma_id}/duplicar-lote", json={"nomes": nomes})
+                assert response.status_code == 201, response.status_code
+                data = response.get_json()
+                assert data["schedules_copiados"] == WEEKS and len(data["turmas"]) == size, data["message"]
+                print(f"{'/api/turmas/<id>/duplicar-lote':<32} {size:>7} {counter.count:>8} {elapsed['ms']:>9.1f} {data['tempo_ms']:>10.1f}")
+        finally:
+            drop_bench_user(user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Throughput and peak Python memory of XLSX, CSV and NDJSON import jobs, from upload to done.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_import.py [rows]
+"""
+import io
+import csv
+import sys
+import json
+import time
+import tracemalloc
+from io import BytesIO
+from openpyxl import Workbook
+from common import app, db, timed, create_bench_user, drop_bench_user, logged_in_client
+from models import Turma
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+HEADERS = ["Semana", "Atividades", "Unidade Curricular", "Capacidades", "Conhecimentos", "Recursos"]
+CAPACIDADES = "\n".join(f"Capacidade {i + 1}" for i in range(6))
+
+
+def sample_rows(rows):
+    for semana in range(1, rows + 1):
+        yield [semana, f"Atividades da semana {semana}", "Unidade", CAPACIDADES, "Conhecimentos", "Computador, Projetor"]
+
+
+def build_xlsx(rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Cronograma")
+    ws.append(["Template de Importacao de Cronograma"])
+    ws.append([])
+    ws.append([])
+    ws.append(HEADERS)
+    for row in sample_rows(rows):
+        ws.append(row)
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def build_csv(rows):
+    text = io.StringIO()
+    writer = csv.writer(text, delimiter=';')
+    writer.writerow(HEADERS)
+    writer.writerows(sample_rows(rows))
+    return text.getvalue().encode('utf-8')
+
+
+def build_ndjson(rows):
+    keys = ["semana", "atividades", "unidadeCurricular", "capacidades", "conhecimentos", "recursos"]
+    return "".join(json.dumps(dict(zip(keys, row))) + "\n" for row in sample_rows(rows)).encode('utf-8')
+
+
+FORMATS = [
+    ("xlsx", build_xlsx),
+    ("csv", build_csv),
+    ("ndjson", build_ndjson),
+]
+
+
+def create_turma(user_id):
+    turma = Turma(user_id=user_id, nome="Importacao", active=True, concluida=False)
+    db.session.add(turma)
+    db.session.commit()
+    return turma.id
+
+
+def run_import(client, turma_id, data, extension, modo="ignorar"):
+    response = client.post(
+        "/api/cronograma/importar",
+        data={"turma_id": turma_id, "modo": modo, "arquivo": (BytesIO(data), f"cronograma.{extension}")},
+        headers={"Accept": "application/json"},
+        content_type="multipart/form-data"
+    )
+    assert response.status_code == 202, response.status_code
+    job = response.get_json()
+    while job['status'] in ('queued', 'running'):
+        time.sleep(0.05)
+        job = client.get(job['status_url']).get_json()
+    assert job['status'] == 'done', job
+    return job
+
+
+def main():
+    with app.app_context():
+        user_id = create_bench_user()
+        try:
+            client = logged_in_client(user_id)
+            print(f"{ROWS} rows")
+            print(f"{'format':<8} {'file KB':>8} {'ms':>8} {'rows/s':>8} {'peak MB':>8}")
+            for extension, build in FORMATS:
+                data = build(ROWS)
+
+                turma_id = create_turma(user_id)
+                with timed() as elapsed:
+                    job = run_import(client, turma_id, data, extension)
+                assert job['importadas'] == ROWS, job
+
+                # tracemalloc slows the import down a lot, so peak memory gets its own run
+                tracemalloc.start()
+                run_import(client, create_turma(user_id), data, extension)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                print(f"{extension:<8} {len(data) / 1024:>8.0f} {elapsed['ms']:>8.0f} {ROWS / elapsed['ms'] * 1000:>8.0f} {peak / 1024 / 1024:>8.1f}")
+
+            # Re-import a corrected CSV over the last turma: half the weeks change
+            corrected = build_csv(ROWS).replace(b"Unidade", b"Unidade revisada", ROWS // 2 + 1)
+            with timed() as elapsed:
+                job = run_import(client, turma_id, corrected, "csv", modo="atualizar")
+            assert job['atualizadas'] == ROWS // 2 and job['inalteradas'] == ROWS - ROWS // 2, job
+            print(f"csv upsert: {job['atualizadas']} updated, {job['inalteradas']} unchanged in {elapsed['ms']:.0f} ms")
+        finally:
+            drop_bench_user(user_id)
+
+
+if __name__ == "__main__":
+    main()
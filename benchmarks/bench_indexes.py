@@ -0,0 +1,121 @@
+"""Latency of the hot schedule/turma filters with and without the composite indexes.
+
+Seeds a throwaway user plus background rows (1M schedules by default) spread
+over other throwaway users, drops the indexes declared on the models, measures,
+recreates them through ensure_indexes() and measures again. The PDF report is
+timed through reports.render_pdf, since the endpoint serves it from the report
+cache after the first request.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_indexes.py [total_schedules]
+"""
+import sys
+import statistics
+
+from sqlalchemy import text
+
+from common import (app, db, timed, create_bench_user, seed_turmas, drop_bench_user,
+                    logged_in_client, User, Turma, Schedule)
+from app import ensure_indexes
+from reports import render_pdf
+
+NOISE_USERS = 200
+WEEKS_PER_TURMA = 100
+CHUNK = 10000
+REPEAT = 5
+
+
+def seed_noise(total_schedules):
+    user_ids = [create_bench_user() for _ in range(NOISE_USERS)]
+    turmas_needed = max(1, total_schedules // WEEKS_PER_TURMA)
+    result = db.session.execute(Turma.__table__.insert().returning(Turma.__table__.c.id), [
+        {"user_id": user_ids[i % NOISE_USERS], "nome": f"Turma {i}", "active": True, "concluida": False}
+        for i in range(turmas_needed)
+    ])
+    turmas = [(turma_id, user_ids[i % NOISE_USERS]) for i, turma_id in enumerate(result.scalars())]
+
+    rows = []
+    for turma_id, user_id in turmas:
+        for semana in range(1, WEEKS_PER_TURMA + 1):
+            rows.append({
+                "user_id": user_id, "turma_id": turma_id, "semana": semana,
+                "atividades": "Atividades", "unidade_curricular": "Unidade",
+                "capacidades": "Capacidade 1\nCapacidade 2", "capacidades_mask": 0,
+                "conhecimentos": "", "recursos": "", "completed": False,
+                "capacidades_total": 2, "capacidades_done": 0
+            })
+            if len(rows) >= CHUNK:
+                db.session.execute(Schedule.__table__.insert(), rows)
+                rows = []
+    if rows:
+        db.session.execute(Schedule.__table__.insert(), rows)
+    db.session.commit()
+    return user_ids
+
+
+def drop_noise(user_ids):
+    db.session.execute(Schedule.__table__.delete().where(Schedule.user_id.in_(user_ids)))
+    db.session.execute(Turma.__table__.delete().where(Turma.user_id.in_(user_ids)))
+    db.session.execute(User.__table__.delete().where(User.id.in_(user_ids)))
+    db.session.commit()
+
+
+def drop_indexes():
+    for table in (Turma.__table__, Schedule.__table__):
+        for index in table.indexes:
+            db.session.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    db.session.commit()
+
+
+def get(client, url):
+    def request():
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+    return request
+
+
+def measure(cases):
+    results = {}
+    for label, run in cases:
+        samples = []
+        for _ in range(REPEAT):
+            with timed() as elapsed:
+                run()
+            samples.append(elapsed['ms'])
+        results[label] = statistics.median(samples)
+    return results
+
+
+def main():
+    total_schedules = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with app.app_context():
+        print(f"Seeding {total_schedules} background schedules...")
+        noise_user_ids = seed_noise(total_schedules)
+        user_id = create_bench_user()
+        try:
+            turma_ids = seed_turmas(user_id, 10, 40)
+            client = logged_in_client(user_id)
+            cases = [
+                ("/api/weeks", get(client, f"/api/weeks?turma_id={turma_ids[0]}")),
+                ("render_pdf (uncached export)", lambda: render_pdf(user_id, turma_ids[0])),
+                ("/api/turmas/progress", get(client, "/api/turmas/progress")),
+            ]
+
+            drop_indexes()
+            db.session.execute(text("ANALYZE"))
+            before = measure(cases)
+
+            ensure_indexes()
+            db.session.execute(text("ANALYZE"))
+            after = measure(cases)
+
+            print(f"{'endpoint':<36} {'no indexes (ms)':>17} {'indexed (ms)':>17}")
+            for label, _ in cases:
+                print(f"{label:<36} {before[label]:>17.1f} {after[label]:>17.1f}")
+        finally:
+            ensure_indexes()
+            drop_bench_user(user_id)
+            drop_noise(noise_user_ids)
+
+
+if __name__ == "__main__":
+    main()
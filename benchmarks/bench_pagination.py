@@ -0,0 +1,63 @@
+"""Response size and latency of /api/weeks unpaginated vs. keyset pages, as the history grows.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_pagination.py
+"""
+from common import app, count_queries, timed, create_bench_user, seed_turmas, drop_bench_user, logged_in_client
+
+WEEKS_PER_TURMA = 50
+TURMA_COUNTS = [10, 50, 200]
+LIMIT = 100
+RUNS = 5
+
+
+def measure(client, url):
+    timings = []
+    for _ in range(RUNS):
+        with count_queries() as counter, timed() as elapsed:
+            response = client.get(url)
+        assert response.status_code == 200, response.status_code
+        timings.append(elapsed['ms'])
+    return len(response.data), counter.count, min(timings)
+
+
+def page_url(cursor=None):
+    return f"/api/weeks?limit={LIMIT}" + (f"&cursor={cursor}" if cursor else "")
+
+
+def last_page_cursor(client):
+    """Walks the pages to find the cursor of the last one (the deepest keyset seek)"""
+    cursor = None
+    while True:
+        response = client.get(page_url(cursor))
+        next_cursor = response.headers.get('X-Next-Cursor')
+        if not next_cursor:
+            return cursor
+        cursor = next_cursor
+
+
+def main():
+    print(f"{'weeks':>7} {'request':<22} {'KB':>9} {'queries':>8} {'best ms':>9}")
+    with app.app_context():
+        user_id = create_bench_user()
+        try:
+            client = logged_in_client(user_id)
+            seeded = 0
+            for turmas in TURMA_COUNTS:
+                seed_turmas(user_id, turmas - seeded, WEEKS_PER_TURMA)
+                seeded = turmas
+                weeks = turmas * WEEKS_PER_TURMA
+
+                cursor = last_page_cursor(client)
+                for label, url in [
+                    ("unpaginated", "/api/weeks"),
+                    ("first page", page_url()),
+                    ("last page", page_url(cursor)),
+                ]:
+                    size, queries, best = measure(client, url)
+                    print(f"{weeks:>7} {label:<22} {size / 1024:>9.1f} {queries:>8} {best:>9.2f}")
+        finally:
+            drop_bench_user(user_id)
+
+
+if __name__ == "__main__":
+    main()
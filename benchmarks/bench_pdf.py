@@ -0,0 +1,41 @@
+"""Time and peak Python memory per PDF for a 200-week turma.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_pdf.py [runs]
+"""
+import sys
+import tracemalloc
+from common import app, timed, create_bench_user, seed_turmas, drop_bench_user
+from reports import render_pdf
+
+WEEKS = 200
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+
+def main():
+    with app.app_context():
+        user_id = create_bench_user()
+        try:
+            turma_id = seed_turmas(user_id, 1, WEEKS)[0]
+            render_pdf(user_id, turma_id)
+
+            timings = []
+            for _ in range(RUNS):
+                with timed() as elapsed:
+                    buffer, _ = render_pdf(user_id, turma_id)
+                timings.append(elapsed['ms'])
+
+            # tracemalloc slows rendering down a lot, so peak memory gets its own run
+            tracemalloc.start()
+            render_pdf(user_id, turma_id)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"{WEEKS} weeks, {len(buffer.getvalue()) / 1024:.0f} KB per PDF")
+            print(f"best {min(timings):.1f} ms, mean {sum(timings) / len(timings):.1f} ms over {RUNS} runs")
+            print(f"peak Python memory {peak / 1024 / 1024:.1f} MB")
+        finally:
+            drop_bench_user(user_id)
+
+
+if __name__ == "__main__":
+    main()
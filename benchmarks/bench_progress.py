@@ -0,0 +1,30 @@
+"""Query count and latency of the progress endpoints as the number of turmas grows.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_progress.py
+"""
+from common import app, count_queries, timed, create_bench_user, seed_turmas, drop_bench_user, logged_in_client
+
+TURMA_COUNTS = [1, 10, 50, 200]
+WEEKS_PER_TURMA = 20
+
+
+def main():
+    print(f"{'turmas':>7} {'endpoint':<32} {'queries':>8} {'ms':>9}")
+    with app.app_context():
+        for turmas in TURMA_COUNTS:
+            user_id = create_bench_user()
+            try:
+                turma_ids = seed_turmas(user_id, turmas, WEEKS_PER_TURMA)
+                client = logged_in_client(user_id)
+                for url in ["/api/turmas/progress", f"/api/turmas/{turma_ids[-1]}/check-conclusao"]:
+                    with count_queries() as counter, timed() as elapsed:
+                        response = client.get(url)
+                    assert response.status_code == 200, response.status_code
+                    label = url if 'progress' in url else "/api/turmas/<id>/check-conclusao"
+                    print(f"{turmas:>7} {label:<32} {counter.count:>8} {elapsed['ms']:>9.1f}")
+            finally:
+                drop_bench_user(user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Query count per list endpoint as the number of turmas/weeks grows.
+
+Fails (exit code 1) if any endpoint's query count changes with the data size,
+which is how an N+1 in a to_dict() shows up.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_serialization.py
+"""
+import sys
+
+from common import app, db, count_queries, timed, create_bench_user, seed_turmas, drop_bench_user, logged_in_client
+
+TURMA_COUNTS = [1, 5, 25]
+WEEKS_PER_TURMA = 20
+
+
+def endpoints(user_id):
+    return [
+        "/api/turmas",
+        "/api/weeks",
+        "/dashboard",
+        f"/api/admin/users/{user_id}/content",
+    ]
+
+
+def main():
+    counts = {}
+    print(f"{'turmas':>7} {'endpoint':<34} {'queries':>8} {'ms':>9}")
+    with app.app_context():
+        for turmas in TURMA_COUNTS:
+            user_id = create_bench_user(role="admin")
+            try:
+                seed_turmas(user_id, turmas, WEEKS_PER_TURMA)
+                client = logged_in_client(user_id)
+                # Warm the user status cache so only the endpoint's own queries are counted
+                assert client.get("/api/turmas").status_code == 200
+                for url in endpoints(user_id):
+                    # The test client shares this app context's session; start every request cold
+                    db.session.expunge_all()
+                    with count_queries() as counter, timed() as elapsed:
+                        response = client.get(url)
+                    assert response.status_code == 200, (url, response.status_code)
+                    label = url.replace(str(user_id), "<id>")
+                    counts.setdefault(label, set()).add(counter.count)
+                    print(f"{turmas:>7} {label:<34} {counter.count:>8} {elapsed['ms']:>9.1f}")
+            finally:
+                drop_bench_user(user_id)
+
+    growing = [label for label, seen in counts.items() if len(seen) > 1]
+    if growing:
+        print(f"Query count grows with data size: {', '.join(growing)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Bytes and latency of refreshing a turma after one save: full refetch vs. /api/weeks?since= delta.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_sync.py
+"""
+from common import app, count_queries, timed, create_bench_user, seed_turmas, drop_bench_user, logged_in_client
+
+WEEK_COUNTS = [50, 200, 1000]
+RUNS = 20
+
+
+def measure(client, url, save, received=None):
+    """Saves once, then times the refresh; received sees each response (e.g. to advance the revision)"""
+    size = queries = 0
+    timings = []
+    for _ in range(RUNS):
+        save()
+        with count_queries() as counter, timed() as elapsed:
+            response = client.get(url())
+        assert response.status_code == 200, response.status_code
+        if received:
+            received(response.get_json())
+        timings.append(elapsed['ms'])
+        size += len(response.data)
+        queries += counter.count
+    return size / RUNS, queries / RUNS, min(timings)
+
+
+def main():
+    print(f"{'weeks':>6} {'refresh':<14} {'KB':>9} {'queries':>8} {'best ms':>9}")
+    with app.app_context():
+        user_id = create_bench_user()
+        try:
+            client = logged_in_client(user_id)
+            for weeks in WEEK_COUNTS:
+                turma_id = seed_turmas(user_id, 1, weeks)[0]
+                week_id = client.get(f"/api/weeks?turma_id={turma_id}&limit=1").get_json()[0]["id"]
+                state = {"revision": client.get(f"/api/weeks?turma_id={turma_id}&since=0").get_json()["revision"]}
+
+                def save():
+                    assert client.post(f"/api/weeks/{week_id}/toggle-complete").status_code == 200
+
+                def delta_url():
+                    return f"/api/weeks?turma_id={turma_id}&since={state['revision']}"
+
+                def advance(delta):
+                    assert [w["id"] for w in delta["semanas"]] == [week_id], delta
+                    state["revision"] = delta["revision"]
+
+                for label, url, received in [
+                    ("full list", lambda: f"/api/weeks?turma_id={turma_id}", None),
+                    ("since delta", delta_url, advance),
+                ]:
+                    size, queries, best = measure(client, url, save, received)
+                    print(f"{weeks:>6} {label:<14} {size / 1024:>9.1f} {queries:>8.1f} {best:>9.2f}")
+        finally:
+            drop_bench_user(user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Latency of the week/capacidade toggles and a lost-update check under parallel clicks.
+
+Also compares marking a week and all its capacidades with one request per
+click against a single /api/weeks/batch request.
+
+Every thread toggles its own capacidade and the week itself an odd number of
+times, so after the run each capacidade must be marked and the week state
+must match the parity of the total number of toggles.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_toggles.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+from common import app, db, count_queries, timed, create_bench_user, seed_turmas, drop_bench_user, logged_in_client
+from models import Turma, Schedule
+
+RUNS = 200
+THREADS = 6
+TOGGLES_PER_THREAD = 25
+
+
+def reset_week(week_id):
+    db.session.query(Schedule).filter_by(id=week_id).update({
+        "completed": False, "capacidades_mask": 0, "capacidades_done": 0
+    })
+    db.session.commit()
+
+
+def measure(client, url, body):
+    timings = []
+    with count_queries() as counter:
+        for _ in range(RUNS):
+            with timed() as elapsed:
+                response = client.post(url, json=body)
+            assert response.status_code == 200, response.status_code
+            timings.append(elapsed['ms'])
+    print(f"{url.rsplit('/', 1)[-1]:<20} {counter.count / RUNS:>8.1f} {min(timings):>8.2f} {sum(timings) / RUNS:>8.2f}")
+
+
+def measure_mark_week(client, week_id):
+    """Marks the week and its capacidades done, click by click and then in one batch"""
+    single = []
+    batch = []
+    with count_queries() as single_counter:
+        for run in range(RUNS):
+            completed = run % 2 == 0
+            with timed() as elapsed:
+                for index in range(THREADS):
+                    client.post(f"/api/weeks/{week_id}/toggle-capacidade", json={"index": index, "completed": completed})
+                client.post(f"/api/weeks/{week_id}/toggle-complete", json={"completed": completed})
+            single.append(elapsed['ms'])
+    with count_queries() as batch_counter:
+        for run in range(RUNS):
+            completed = run % 2 == 0
+            capacidades = {"marcar" if completed else "desmarcar": list(range(THREADS))}
+            with timed() as elapsed:
+                response = client.post("/api/weeks/batch", json={"operations": [
+                    {"op": "complete", "id": week_id, "completed": completed},
+                    {"op": "capacidades", "id": week_id, **capacidades},
+                ]})
+            assert response.status_code == 200, response.get_json()
+            batch.append(elapsed['ms'])
+    for label, counter, timings in [("7 requests", single_counter, single), ("1 batch request", batch_counter, batch)]:
+        print(f"{label:<20} {counter.count / RUNS:>8.1f} {min(timings):>8.2f} {sum(timings) / RUNS:>8.2f}")
+
+
+def hammer(user_id, week_id, index):
+    client = logged_in_client(user_id)
+    for _ in range(TOGGLES_PER_THREAD):
+        assert client.post(f"/api/weeks/{week_id}/toggle-capacidade", json={"index": index}).status_code == 200
+        assert client.post(f"/api/weeks/{week_id}/toggle-complete").status_code == 200
+
+
+def main():
+    with app.app_context():
+        user_id = create_bench_user()
+        try:
+            turma_id = seed_turmas(user_id, 1, 1, capacidades_per_week=THREADS)[0]
+            week_id = db.session.query(Schedule.id).filter_by(turma_id=turma_id).scalar()
+            client = logged_in_client(user_id)
+
+            print(f"{'endpoint':<20} {'queries':>8} {'best ms':>8} {'mean ms':>8}")
+            reset_week(week_id)
+            measure(client, f"/api/weeks/{week_id}/toggle-complete", None)
+            measure(client, f"/api/weeks/{week_id}/toggle-capacidade", {"index": 0})
+
+            print(f"\n{'mark week + caps':<20} {'queries':>8} {'best ms':>8} {'mean ms':>8}")
+            reset_week(week_id)
+            measure_mark_week(client, week_id)
+            print()
+
+            reset_week(week_id)
+            with ThreadPoolExecutor(max_workers=THREADS) as pool:
+                for future in [pool.submit(hammer, user_id, week_id, index) for index in range(THREADS)]:
+                    future.result()
+
+            db.session.expire_all()
+            week = db.session.get(Schedule, week_id)
+            turma = db.session.get(Turma, turma_id)
+            marked = sorted(int(x) for x in week.capacidades_completed.split(',') if x)
+            expected_completed = (THREADS * TOGGLES_PER_THREAD) % 2 == 1
+            assert marked == list(range(THREADS)), marked
+            assert week.capacidades_done == THREADS, week.capacidades_done
+            assert week.completed == expected_completed, week.completed
+            assert turma.capacidades_done == THREADS and turma.semanas_done == int(expected_completed)
+            print(f"{THREADS} threads x {TOGGLES_PER_THREAD} toggles: no lost updates")
+        finally:
+            drop_bench_user(user_id)
+
+
+if __name__ == "__main__":
+    main()
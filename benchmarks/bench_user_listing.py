@@ -0,0 +1,70 @@
+"""Checks that user listings and current-user pages never load the raw photo columns.
+
+users.photo_data and users.photo_blob are deferred: avatars are served from
+the resized user_photos variants. Seeds an admin and some users with large
+legacy photo columns, requests every admin listing and page that loads the
+current user, and fails (exit code 1) if any statement selects either column.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_user_listing.py
+"""
+import re
+import sys
+
+from common import app, db, count_queries, timed, create_bench_user, drop_bench_user, logged_in_client, User
+
+USERS = 20
+PHOTO_BYTES = 200 * 1024
+RAW_PHOTO_COLUMNS = re.compile(r'\busers\.photo_(data|blob)\b')
+
+
+def endpoints(admin_id):
+    return [
+        "/api/users",
+        "/api/users?limit=10",
+        "/api/admin/overview",
+        f"/api/admin/users/{admin_id}/content",
+        "/admin",
+        "/perfil",
+        "/dashboard",
+    ]
+
+
+def main():
+    failures = []
+    print(f"{'endpoint':<34} {'queries':>8} {'ms':>9}  raw photo columns")
+    with app.app_context():
+        admin_id = create_bench_user(role="admin")
+        user_ids = [create_bench_user() for _ in range(USERS)]
+        try:
+            db.session.query(User).filter(User.id.in_([admin_id] + user_ids)).update({
+                "photo_data": "A" * PHOTO_BYTES,
+                "photo_blob": b"\0" * PHOTO_BYTES,
+            }, synchronize_session=False)
+            db.session.commit()
+            client = logged_in_client(admin_id)
+
+            for url in endpoints(admin_id):
+                db.session.expunge_all()
+                with count_queries() as counter, timed() as elapsed:
+                    response = client.get(url)
+                assert response.status_code == 200, (url, response.status_code)
+                raw = [statement for statement in counter.statements if RAW_PHOTO_COLUMNS.search(statement)]
+                label = url.replace(str(admin_id), "<id>")
+                print(f"{label:<34} {counter.count:>8} {elapsed['ms']:>9.1f}  {'YES' if raw else 'no'}")
+                if raw:
+                    failures.append((label, raw))
+        finally:
+            for user_id in user_ids:
+                drop_bench_user(user_id)
+            drop_bench_user(admin_id)
+
+    for label, statements in failures:
+        print(f"\n{label} selected a raw photo column:")
+        for statement in statements:
+            print(f"  {' '.join(statement.split())[:300]}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Peak RSS of a full-account XLSX export at 10k and 100k weeks.
+
+Each render runs in a fresh child process so ru_maxrss only reflects that
+export (Linux only, the baseline RSS is read from /proc).
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_xlsx.py
+"""
+import os
+import sys
+import time
+import resource
+import subprocess
+
+ROW_COUNTS = [10_000, 100_000]
+WEEKS_PER_TURMA = 1000
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+
+
+def child(user_id):
+    from common import app
+    from reports import render_xlsx
+    with app.app_context():
+        before = current_rss_mb()
+        start = time.perf_counter()
+        buffer, _ = render_xlsx(user_id)
+        elapsed = time.perf_counter() - start
+        print(f"{before:.1f} {peak_rss_mb():.1f} {elapsed:.2f} {len(buffer.getvalue()) / 1024 / 1024:.1f}")
+
+
+def main():
+    from common import app, create_bench_user, seed_turmas, drop_bench_user
+
+    print(f"{'weeks':>8} {'base MB':>8} {'peak MB':>8} {'delta MB':>9} {'s':>7} {'file MB':>8}")
+    with app.app_context():
+        for rows in ROW_COUNTS:
+            user_id = create_bench_user()
+            try:
+                seed_turmas(user_id, rows // WEEKS_PER_TURMA, WEEKS_PER_TURMA)
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--child', str(user_id)],
+                    check=True, capture_output=True, text=True
+                ).stdout.split()
+                base, peak, seconds, size = (float(value) for value in output[-4:])
+                print(f"{rows:>8} {base:>8.1f} {peak:>8.1f} {peak - base:>9.1f} {seconds:>7.2f} {size:>8.1f}")
+            finally:
+                drop_bench_user(user_id)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,107 @@
+"""Shared helpers for the benchmark scripts.
+
+The scripts import the real application, so DATABASE_URL must point to a
+local/disposable database. Every script seeds its own throwaway user and
+removes it at the end.
+"""
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+from app import app, db, invalidate_user_cache  # noqa: E402
+from models import User, Turma, Schedule  # noqa: E402
+from stats import refresh_turma_counters  # noqa: E402
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, *args, **kwargs):
+        self.count += 1
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    event.listen(db.engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, "before_cursor_execute", counter)
+
+
+@contextmanager
+def timed():
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['ms'] = (time.perf_counter() - start) * 1000
+
+
+def create_bench_user(role="user"):
+    user = User(
+        name="Benchmark",
+        email=f"bench-{uuid.uuid4().hex[:12]}@example.com",
+        password_hash="!",
+        role=role,
+        active=True
+    )
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def seed_turmas(user_id, turmas, weeks_per_turma, capacidades_per_week=6):
+    capacidades = "\n".join(f"Capacidade {i + 1}" for i in range(capacidades_per_week))
+    turma_ids = []
+    for t in range(turmas):
+        turma = Turma(user_id=user_id, nome=f"Turma {t + 1}", active=True, concluida=False)
+        db.session.add(turma)
+        db.session.flush()
+        turma_ids.append(turma.id)
+        db.session.execute(Schedule.__table__.insert(), [
+            {
+                "user_id": user_id,
+                "turma_id": turma.id,
+                "semana": semana,
+                "atividades": f"Atividades da semana {semana}",
+                "unidade_curricular": "Unidade",
+                "capacidades": capacidades,
+                "capacidades_mask": 0b11 if semana % 2 else 0,
+                "capacidades_total": capacidades_per_week,
+                "capacidades_done": 2 if semana % 2 else 0,
+                "conhecimentos": "Conhecimentos",
+                "recursos": "Computador, Projetor",
+                "completed": semana % 3 == 0
+            }
+            for semana in range(1, weeks_per_turma + 1)
+        ])
+    refresh_turma_counters(turma_ids)
+    db.session.commit()
+    return turma_ids
+
+
+def drop_bench_user(user_id):
+    db.session.rollback()
+    user = db.session.get(User, user_id)
+    if user:
+        db.session.delete(user)
+        db.session.commit()
+    invalidate_user_cache(user_id)
+
+
+def logged_in_client(user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
@@ -0,0 +1,331 @@
+"""Bulk import of schedule weeks from spreadsheets, CSV and NDJSON files.
+
+Every format is turned into a stream of (row number, values) tuples in the
+template's column order, validated in one streaming pass and inserted in
+executemany batches, so memory stays flat and a large file only costs a
+handful of round trips.
+
+Weeks whose semana already exists in the turma are either skipped
+(IMPORT_MODE_IGNORE) or overwritten with the file's content
+(IMPORT_MODE_UPSERT) through INSERT ... ON CONFLICT (turma_id, semana), which
+relies on the uq_schedules_turma_semana unique index. Rows are written with
+sync.PENDING_REVISION so the import never holds the user's revision lock;
+stamp_import then stamps everything the import wrote with a single revision.
+"""
+import io
+import csv
+import json
+import unicodedata
+from openpyxl import load_workbook
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import Schedule, parse_capacidades, remap_capacidades_mask
+from stats import refresh_turma_counters
+from sync import PENDING_REVISION, stamp_pending_schedules
+
+IMPORT_HEADER_ROW = 4
+IMPORT_COLUMNS = 6
+IMPORT_BATCH_SIZE = 500
+
+IMPORT_MODE_IGNORE = 'ignorar'
+IMPORT_MODE_UPSERT = 'atualizar'
+IMPORT_MODES = (IMPORT_MODE_IGNORE, IMPORT_MODE_UPSERT)
+
+# Columns an upsert overwrites; done capacidades follow their text and the week's completed flag is kept
+UPSERT_COLUMNS = [
+    'atividades', 'unidade_curricular', 'capacidades', 'conhecimentos', 'recursos',
+    'capacidades_mask', 'capacidades_total', 'capacidades_done',
+]
+
+# Template column order; CSV headers and NDJSON keys are matched against these
+IMPORT_FIELDS = ['semana', 'atividades', 'unidade', 'capacidades', 'conhecimentos', 'recursos']
+NDJSON_KEYS = {
+    'semana': ['semana'],
+    'atividades': ['atividades'],
+    'unidade': ['unidadeCurricular', 'unidade_curricular'],
+    'capacidades': ['capacidades'],
+    'conhecimentos': ['conhecimentos'],
+    'recursos': ['recursos'],
+}
+
+
+def iter_xlsx_rows(file):
+    """Yields (row number, values) for every row below the template header"""
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        # Some writers leave a wrong <dimension> tag; read whatever rows exist instead
+        ws.reset_dimensions()
+        first_row = IMPORT_HEADER_ROW + 1
+        for row_idx, values in enumerate(ws.iter_rows(min_row=first_row, max_col=IMPORT_COLUMNS, values_only=True), first_row):
+            yield row_idx, values
+    finally:
+        wb.close()
+
+
+def _text_stream(file):
+    """Wraps an uploaded binary stream as text, falling back to cp1252 for non UTF-8 files"""
+    sample = file.read(64 * 1024)
+    file.seek(0)
+    encoding = 'utf-8-sig'
+    try:
+        sample.decode(encoding)
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is still valid UTF-8
+        if e.reason != 'unexpected end of data':
+            encoding = 'cp1252'
+    return io.TextIOWrapper(file, encoding=encoding, newline='')
+
+
+def _normalize_header(value):
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode('ascii')
+    return text.strip().lower()
+
+
+def _csv_column_map(header):
+    """Column index for each IMPORT_FIELDS entry, matched by the header's first word"""
+    columns = {}
+    for idx, value in enumerate(header):
+        words = _normalize_header(value).split()
+        if words and words[0] in IMPORT_FIELDS and words[0] not in columns:
+            columns[words[0]] = idx
+    if 'semana' not in columns:
+        raise ValueError("Cabecalho invalido: a primeira linha do CSV deve conter a coluna 'Semana'")
+    return [columns.get(field) for field in IMPORT_FIELDS]
+
+
+def iter_csv_rows(file):
+    """Yields (line number, values) for every CSV record after the header line"""
+    text = _text_stream(file)
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.reader(text, dialect)
+    header = next(reader, None)
+    if header is None:
+        return
+    column_map = _csv_column_map(header)
+
+    for record in reader:
+        yield reader.line_num, tuple(
+            record[idx] if idx is not None and idx < len(record) else None for idx in column_map
+        )
+
+
+def _ndjson_value(item, field):
+    for key in NDJSON_KEYS[field]:
+        if key in item:
+            value = item[key]
+            return "\n".join(str(v) for v in value) if isinstance(value, list) else value
+    return None
+
+
+def iter_ndjson_rows(file):
+    """Yields (line number, values) for every NDJSON line; unparseable lines yield an error message"""
+    for line_number, line in enumerate(_text_stream(file), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield line_number, "JSON invalido"
+            continue
+        if not isinstance(item, dict):
+            yield line_number, "Cada linha deve ser um objeto JSON"
+            continue
+        yield line_number, tuple(_ndjson_value(item, field) for field in IMPORT_FIELDS)
+
+
+IMPORT_READERS = {
+    '.xlsx': iter_xlsx_rows,
+    '.xls': iter_xlsx_rows,
+    '.csv': iter_csv_rows,
+    '.ndjson': iter_ndjson_rows,
+    '.jsonl': iter_ndjson_rows,
+}
+
+
+def import_extension(filename):
+    """Supported extension of the uploaded file name, or None"""
+    for extension in IMPORT_READERS:
+        if filename.lower().endswith(extension):
+            return extension
+    return None
+
+
+def import_reader(filename):
+    """Row reader for the upload's extension, or None if the format is not supported"""
+    extension = import_extension(filename)
+    return IMPORT_READERS[extension] if extension else None
+
+
+def _insert_statement():
+    table = Schedule.__table__
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table), table
+
+
+def _insert_batch(batch):
+    """Inserts the batch, skipping weeks another request created meanwhile; returns the semanas inserted"""
+    stmt, table = _insert_statement()
+    stmt = stmt.on_conflict_do_nothing(index_elements=['turma_id', 'semana']).returning(table.c.semana)
+    return {semana for (semana,) in db.session.execute(stmt, batch)}
+
+
+def _upsert_batch(batch):
+    """Inserts or overwrites the batch; returns the semanas actually written.
+
+    Rows whose content is already identical are left alone by the WHERE
+    clause, so they are neither rewritten nor returned.
+    """
+    stmt, table = _insert_statement()
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['turma_id', 'semana'],
+        set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS + ['revision', 'updated_at']},
+        where=or_(*(table.c[column].is_distinct_from(stmt.excluded[column]) for column in UPSERT_COLUMNS))
+    ).returning(table.c.semana)
+    return {semana for (semana,) in db.session.execute(stmt, batch)}
+
+
+def import_schedule_rows(user_id, turma_id, rows, batch_size=IMPORT_BATCH_SIZE, progress=None, mode=IMPORT_MODE_IGNORE):
+    """Validates (row number, values) rows and writes the weeks into the turma.
+
+    values is a tuple in IMPORT_FIELDS order, or an error message for rows the
+    reader could not parse. Existing semanas are skipped, or overwritten when
+    mode is IMPORT_MODE_UPSERT. Returns a report with the inserted (importadas),
+    updated (atualizadas), unchanged (inalteradas) and skipped (ignoradas)
+    counts and one entry per rejected row. progress, if given, is called with
+    the report every batch_size rows. Nothing is committed here, the caller
+    owns the transaction; after committing it calls stamp_import.
+    """
+    upsert = mode == IMPORT_MODE_UPSERT
+    if upsert:
+        # The current capacidades and marks are needed to carry the marks over to the new text
+        semanas_existentes = {
+            semana: (capacidades, mask) for semana, capacidades, mask in db.session.query(
+                Schedule.semana, Schedule.capacidades, Schedule.capacidades_mask
+            ).filter_by(user_id=user_id, turma_id=turma_id)
+        }
+    else:
+        semanas_existentes = dict.fromkeys(
+            semana for (semana,) in db.session.query(Schedule.semana).filter_by(user_id=user_id, turma_id=turma_id)
+        )
+    semanas_arquivo = set()
+    report = {"processadas": 0, "importadas": 0, "atualizadas": 0, "inalteradas": 0, "ignoradas": 0, "erros": []}
+    batch = []
+    next_progress = batch_size
+
+    def flush():
+        if upsert:
+            written = _upsert_batch(batch)
+            for row in batch:
+                if row["semana"] not in semanas_existentes:
+                    report["importadas"] += 1
+                elif row["semana"] in written:
+                    report["atualizadas"] += 1
+                else:
+                    report["inalteradas"] += 1
+        else:
+            inserted = len(_insert_batch(batch))
+            report["importadas"] += inserted
+            report["ignoradas"] += len(batch) - inserted
+        batch.clear()
+
+    for row_idx, values in rows:
+        if progress and report["processadas"] >= next_progress:
+            progress(report)
+            next_progress += batch_size
+
+        if isinstance(values, str):
+            report["processadas"] += 1
+            report["erros"].append({"linha": row_idx, "semana": "", "mensagem": values})
+            continue
+
+        semana_cell = values[0]
+
+        if semana_cell is None or str(semana_cell).strip() == '':
+            continue
+
+        report["processadas"] += 1
+
+        try:
+            semana = int(semana_cell)
+        except (ValueError, TypeError):
+            report["erros"].append({
+                "linha": row_idx,
+                "semana": str(semana_cell),
+                "mensagem": f"Numero de semana invalido '{semana_cell}'"
+            })
+            continue
+
+        if semana in semanas_arquivo:
+            if upsert:
+                report["erros"].append({
+                    "linha": row_idx,
+                    "semana": str(semana),
+                    "mensagem": f"Semana {semana} repetida no arquivo"
+                })
+            else:
+                report["ignoradas"] += 1
+            continue
+        semanas_arquivo.add(semana)
+
+        if semana in semanas_existentes and not upsert:
+            report["ignoradas"] += 1
+            continue
+
+        atividades, unidade_curricular, capacidades, conhecimentos, recursos = (
+            str(value or '').strip() for value in values[1:IMPORT_COLUMNS]
+        )
+        capacidades_mask = 0
+        if semana in semanas_existentes:
+            capacidades_atuais, mask_atual = semanas_existentes[semana]
+            capacidades_mask = remap_capacidades_mask(capacidades_atuais, capacidades, mask_atual)
+        batch.append({
+            "user_id": user_id,
+            "turma_id": turma_id,
+            "semana": semana,
+            "atividades": atividades,
+            "unidade_curricular": unidade_curricular,
+            "capacidades": capacidades,
+            "capacidades_mask": capacidades_mask,
+            "capacidades_total": len(parse_capacidades(capacidades)),
+            "capacidades_done": capacidades_mask.bit_count(),
+            "conhecimentos": conhecimentos,
+            "recursos": recursos,
+            "completed": False,
+            "revision": PENDING_REVISION
+        })
+
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    return report
+
+
+def stamp_import(user_id, turma_id):
+    """Gives the committed import its sync revision and refreshes the turma counters; the caller commits"""
+    revision = stamp_pending_schedules(user_id, turma_id)
+    refresh_turma_counters([turma_id], revision=revision)
+
+
+def import_summary(report):
+    """One-line Portuguese summary of an import report"""
+    mensagem = f"Importacao concluida! {report['importadas']} semana(s) importada(s)"
+    if report["atualizadas"]:
+        mensagem += f", {report['atualizadas']} atualizada(s)"
+    if report["inalteradas"]:
+        mensagem += f", {report['inalteradas']} sem alteracoes"
+    if report["ignoradas"] > 0:
+        mensagem += f", {report['ignoradas']} ignorada(s) por ja existirem"
+    if report["erros"]:
+        mensagem += f". {len(report['erros'])} erro(s) encontrado(s)"
+    return mensagem
@@ -0,0 +1,237 @@
+"""Background export and import jobs.
+
+Reports are rendered and uploads imported by a small thread pool inside each
+web process, so HTTP workers only enqueue and poll. Job state lives on the
+filesystem (one JSON file plus the generated or uploaded file per job), which
+lets any gunicorn worker answer status and download requests for a job started
+by another worker. Exports and imports have separate pools, so a long import
+never delays a download. A job whose process died never finishes: a queued
+job is reported as failed once the process that queued it is gone, and a
+running job once its state file has not been written for JOB_STALE_AFTER
+seconds (imports rewrite it on every progress update). Queued jobs are not
+timed, as they may legitimately wait behind long ones.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from app import db
+from reports import PDF_MIMETYPE, XLSX_MIMETYPE
+from report_cache import get_report
+from importer import import_extension, import_reader, import_schedule_rows, import_summary, stamp_import
+
+EXPORT_JOBS_DIR = os.path.join('data', 'exports')
+IMPORT_JOBS_DIR = os.path.join('data', 'imports')
+EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL', 3600))
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 1))
+JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 900))
+JOB_STALE_ERROR = "O processamento foi interrompido. Tente novamente."
+
+EXPORT_FORMATS = {
+    'pdf': PDF_MIMETYPE,
+    'xlsx': XLSX_MIMETYPE,
+}
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export-job')
+_import_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import-job')
+
+
+def _meta_path(job_id, jobs_dir=EXPORT_JOBS_DIR):
+    return os.path.join(jobs_dir, f"{job_id}.json")
+
+
+def job_file_path(job, jobs_dir=EXPORT_JOBS_DIR):
+    return os.path.join(jobs_dir, f"{job['id']}.{job['format']}")
+
+
+def _save_job(job, jobs_dir=EXPORT_JOBS_DIR):
+    os.makedirs(jobs_dir, exist_ok=True)
+    tmp_path = _meta_path(job['id'], jobs_dir) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, _meta_path(job['id'], jobs_dir))
+
+
+def _process_alive(pid):
+    """Whether the process with this pid (on this host) still exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _job_is_stale(job, last_update):
+    if job['status'] == 'running':
+        return time.time() - last_update > JOB_STALE_AFTER
+    if job['status'] == 'queued':
+        return job.get('pid') is not None and not _process_alive(job['pid'])
+    return False
+
+
+def get_job(job_id, jobs_dir=EXPORT_JOBS_DIR):
+    if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+        return None
+    path = _meta_path(job_id, jobs_dir)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            job = json.load(f)
+        last_update = os.path.getmtime(path)
+    except (OSError, ValueError):
+        return None
+    if _job_is_stale(job, last_update):
+        job['status'] = 'failed'
+        job['error'] = JOB_STALE_ERROR
+        job['finished_at'] = time.time()
+        _save_job(job, jobs_dir)
+    return job
+
+
+def cleanup_expired_jobs(jobs_dir=EXPORT_JOBS_DIR):
+    """Remove job metadata and generated files older than EXPORT_JOB_TTL"""
+    if not os.path.isdir(jobs_dir):
+        return
+    limit = time.time() - EXPORT_JOB_TTL
+    for name in os.listdir(jobs_dir):
+        path = os.path.join(jobs_dir, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _run_job(app, job):
+    job['status'] = 'running'
+    job['started_at'] = time.time()
+    _save_job(job)
+
+    try:
+        with app.app_context():
+            report_path, filename, _ = get_report(job['user_id'], job['turma_id'], job['format'])
+        tmp_path = job_file_path(job) + '.tmp'
+        shutil.copyfile(report_path, tmp_path)
+        os.replace(tmp_path, job_file_path(job))
+        job['status'] = 'done'
+        job['filename'] = filename
+    except Exception as e:
+        logging.exception(f"Export job {job['id']} failed")
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    job['finished_at'] = time.time()
+    _save_job(job)
+
+
+def submit_export_job(app, user_id, export_format, turma_id=None):
+    cleanup_expired_jobs()
+    job = {
+        'id': uuid.uuid4().hex,
+        'user_id': user_id,
+        'format': export_format,
+        'turma_id': turma_id,
+        'status': 'queued',
+        'pid': os.getpid(),
+        'filename': None,
+        'error': None,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+    }
+    _save_job(job)
+    _executor.submit(_run_job, app, dict(job))
+    return job
+
+
+def job_mimetype(job):
+    return EXPORT_FORMATS[job['format']]
+
+
+def get_import_job(job_id):
+    return get_job(job_id, IMPORT_JOBS_DIR)
+
+
+def _run_import_job(app, job):
+    job['status'] = 'running'
+    job['started_at'] = time.time()
+    _save_job(job, IMPORT_JOBS_DIR)
+
+    def progress(report):
+        job.update(
+            processadas=report['processadas'],
+            importadas=report['importadas'],
+            atualizadas=report['atualizadas'],
+            inalteradas=report['inalteradas'],
+            ignoradas=report['ignoradas'],
+            erros_count=len(report['erros'])
+        )
+        _save_job(job, IMPORT_JOBS_DIR)
+
+    upload_path = job_file_path(job, IMPORT_JOBS_DIR)
+    try:
+        with app.app_context():
+            try:
+                reader = import_reader(upload_path)
+                with open(upload_path, 'rb') as f:
+                    report = import_schedule_rows(
+                        job['user_id'], job['turma_id'], reader(f), progress=progress, mode=job['mode']
+                    )
+                db.session.commit()
+                # Short second transaction: the user's revision lock is held only for the stamp
+                stamp_import(job['user_id'], job['turma_id'])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        progress(report)
+        job['erros'] = report['erros']
+        job['message'] = import_summary(report)
+        job['status'] = 'done'
+    except Exception as e:
+        logging.exception(f"Import job {job['id']} failed")
+        job['status'] = 'failed'
+        job['error'] = f"Erro ao processar arquivo: {str(e)}"
+    finally:
+        try:
+            os.remove(upload_path)
+        except OSError:
+            pass
+    job['finished_at'] = time.time()
+    _save_job(job, IMPORT_JOBS_DIR)
+
+
+def submit_import_job(app, user_id, turma_id, upload, mode):
+    """Stores the uploaded file and queues its import; upload is a werkzeug FileStorage"""
+    cleanup_expired_jobs(IMPORT_JOBS_DIR)
+    job = {
+        'id': uuid.uuid4().hex,
+        'user_id': user_id,
+        'turma_id': turma_id,
+        'format': import_extension(upload.filename).lstrip('.'),
+        'filename': upload.filename,
+        'mode': mode,
+        'status': 'queued',
+        'pid': os.getpid(),
+        'error': None,
+        'message': None,
+        'processadas': 0,
+        'importadas': 0,
+        'atualizadas': 0,
+        'inalteradas': 0,
+        'ignoradas': 0,
+        'erros_count': 0,
+        'erros': [],
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+    }
+    os.makedirs(IMPORT_JOBS_DIR, exist_ok=True)
+    upload.save(job_file_path(job, IMPORT_JOBS_DIR))
+    _save_job(job, IMPORT_JOBS_DIR)
+    _import_executor.submit(_run_import_job, app, dict(job))
+    return job
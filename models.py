@@ -1,5 +1,53 @@
+import hashlib
+from collections import Counter
 from app import db
+from photos import build_photo_variants
 from datetime import datetime
+from sqlalchemy.orm import joinedload, deferred
+
+
+def parse_capacidades(capacidades):
+    return [c.strip() for c in (capacidades or '').split('\n') if c.strip()]
+
+
+def parse_capacidades_completed(capacidades_completed):
+    return [x for x in (capacidades_completed or '').split(',') if x]
+
+
+# capacidades_mask is a signed BIGINT: bit i set means capacidade i is done
+CAPACIDADES_MASK_BITS = 63
+
+
+def capacidades_mask_from_indices(indices, total=CAPACIDADES_MASK_BITS):
+    """Bitmask for a list of done indices; duplicates and indices outside the capacidades drop out"""
+    limit = min(total, CAPACIDADES_MASK_BITS)
+    mask = 0
+    for index in indices:
+        try:
+            index = int(index)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < limit:
+            mask |= 1 << index
+    return mask
+
+
+def capacidades_mask_indices(mask):
+    mask = mask or 0
+    return [index for index in range(mask.bit_length()) if mask >> index & 1]
+
+
+def remap_capacidades_mask(old_capacidades, new_capacidades, mask):
+    """Carries the done bits over to an edited capacidades text, matching capacidades by text"""
+    done = Counter(
+        cap for index, cap in enumerate(parse_capacidades(old_capacidades)) if (mask or 0) >> index & 1
+    )
+    new_mask = 0
+    for index, cap in enumerate(parse_capacidades(new_capacidades)[:CAPACIDADES_MASK_BITS]):
+        if done[cap] > 0:
+            done[cap] -= 1
+            new_mask |= 1 << index
+    return new_mask
 
 
 class User(db.Model):
@@ -12,13 +60,34 @@ class User(db.Model):
     role = db.Column(db.String(20), default='user')
     cargo = db.Column(db.String(100), default='')
     photo = db.Column(db.String(255), default='')
-    photo_data = db.Column(db.Text, default='')
+    photo_data = deferred(db.Column(db.Text, default=''))
+    photo_blob = deferred(db.Column(db.LargeBinary, nullable=True))
+    photo_hash = db.Column(db.String(64), default='')
     photo_mimetype = db.Column(db.String(50), default='')
     active = db.Column(db.Boolean, default=True)
+    sync_revision = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     schedules = db.relationship('Schedule', backref='user', lazy=True, cascade='all, delete-orphan')
     turmas = db.relationship('Turma', backref='user', lazy=True, cascade='all, delete-orphan')
+    photo_variants = db.relationship('UserPhoto', lazy=True, cascade='all, delete-orphan')
+    
+    @property
+    def has_photo(self):
+        return bool(self.photo_hash)
+    
+    @property
+    def photo_version(self):
+        return (self.photo_hash or '')[:12]
+    
+    def set_photo(self, photo_bytes):
+        """Processes an uploaded image into the PHOTO_SIZES variants (raises ValueError if invalid)"""
+        mimetype, variants = build_photo_variants(photo_bytes)
+        self.photo_variants = [UserPhoto(size=size, data=data) for size, data in variants.items()]
+        self.photo_hash = hashlib.sha256(photo_bytes).hexdigest()
+        self.photo_mimetype = mimetype
+        self.photo_blob = None
+        self.photo_data = ''
     
     def to_dict(self):
         return {
@@ -28,14 +97,25 @@ class User(db.Model):
             'role': self.role,
             'cargo': self.cargo,
             'photo': self.photo,
-            'has_photo': bool(self.photo_data),
+            'has_photo': self.has_photo,
             'active': self.active,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 
+class UserPhoto(db.Model):
+    __tablename__ = 'user_photos'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    size = db.Column(db.Integer, primary_key=True)
+    data = deferred(db.Column(db.LargeBinary, nullable=False))
+
+
 class Turma(db.Model):
     __tablename__ = 'turmas'
+    __table_args__ = (
+        db.Index('ix_turmas_user_active_concluida', 'user_id', 'active', 'concluida'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -51,12 +131,18 @@ class Turma(db.Model):
     active = db.Column(db.Boolean, default=True)
     concluida = db.Column(db.Boolean, default=False)
     data_conclusao = db.Column(db.DateTime, nullable=True)
+    semanas_total = db.Column(db.Integer, default=0)
+    semanas_done = db.Column(db.Integer, default=0)
+    capacidades_total = db.Column(db.Integer, default=0)
+    capacidades_done = db.Column(db.Integer, default=0)
+    revision = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     schedules = db.relationship('Schedule', backref='turma', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
-        schedule_count = len([s for s in self.schedules if s]) if self.schedules else 0
+        schedule_count = self.semanas_total or 0
         return {
             'id': self.id,
             'nome': self.nome,
@@ -72,12 +158,20 @@ class Turma(db.Model):
             'concluida': self.concluida,
             'data_conclusao': self.data_conclusao.isoformat() if self.data_conclusao else None,
             'schedule_count': schedule_count,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'revision': self.revision or 0,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 
 class Schedule(db.Model):
     __tablename__ = 'schedules'
+    __table_args__ = (
+        db.Index('ix_schedules_user_turma_semana', 'user_id', 'turma_id', 'semana'),
+        db.Index('ix_schedules_user_semana_id', 'user_id', 'semana', 'id'),
+        db.Index('ix_schedules_user_revision', 'user_id', 'revision'),
+        db.Index('uq_schedules_turma_semana', 'turma_id', 'semana', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -86,24 +180,75 @@ class Schedule(db.Model):
     atividades = db.Column(db.Text, default='')
     unidade_curricular = db.Column(db.String(200), default='')
     capacidades = db.Column(db.Text, default='')
-    capacidades_completed = db.Column(db.Text, default='')
+    capacidades_mask = db.Column(db.BigInteger, default=0)
     conhecimentos = db.Column(db.Text, default='')
     recursos = db.Column(db.String(500), default='')
     completed = db.Column(db.Boolean, default=False)
+    capacidades_total = db.Column(db.Integer, default=0)
+    capacidades_done = db.Column(db.Integer, default=0)
+    revision = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def query_with_turma(cls):
+        """Schedule query that loads turma nome/cor in the same SELECT, as needed by to_dict"""
+        return cls.query.options(joinedload(cls.turma).load_only(Turma.nome, Turma.cor))
+    
+    @property
+    def capacidades_completed(self):
+        """Done indices as the comma-separated string the JSON API has always returned"""
+        return ','.join(str(index) for index in capacidades_mask_indices(self.capacidades_mask))
+    
+    def set_capacidades(self, capacidades):
+        """Replaces the capacidades text, keeping the done marks of capacidades that are still there"""
+        if capacidades != self.capacidades:
+            self.capacidades_mask = remap_capacidades_mask(self.capacidades, capacidades, self.capacidades_mask)
+            self.capacidades = capacidades
+    
+    def update_capacidade_counters(self):
+        self.capacidades_total = len(parse_capacidades(self.capacidades))
+        self.capacidades_done = (self.capacidades_mask or 0).bit_count()
     
     def to_dict(self):
+        return self.row_to_dict(
+            self,
+            self.turma.nome if self.turma else None,
+            self.turma.cor if self.turma else None
+        )
+    
+    @staticmethod
+    def row_to_dict(row, turma_nome, turma_cor):
+        """to_dict() for anything with the schedule columns as attributes, e.g. an UPDATE ... RETURNING row"""
         return {
-            'id': self.id,
-            'turma_id': self.turma_id,
-            'turma_nome': self.turma.nome if self.turma else None,
-            'turma_cor': self.turma.cor if self.turma else None,
-            'semana': self.semana,
-            'atividades': self.atividades,
-            'unidadeCurricular': self.unidade_curricular,
-            'capacidades': self.capacidades,
-            'capacidades_completed': self.capacidades_completed or '',
-            'conhecimentos': self.conhecimentos,
-            'recursos': self.recursos,
-            'completed': self.completed
+            'id': row.id,
+            'turma_id': row.turma_id,
+            'turma_nome': turma_nome,
+            'turma_cor': turma_cor,
+            'semana': row.semana,
+            'atividades': row.atividades,
+            'unidadeCurricular': row.unidade_curricular,
+            'capacidades': row.capacidades,
+            'capacidades_completed': ','.join(str(index) for index in capacidades_mask_indices(row.capacidades_mask)),
+            'conhecimentos': row.conhecimentos,
+            'recursos': row.recursos,
+            'completed': row.completed,
+            'revision': row.revision or 0,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
         }
+
+
+class Tombstone(db.Model):
+    """A deleted row, kept so delta syncs (GET /api/weeks?since=) can report the deletion"""
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        db.Index('ix_tombstones_user_revision', 'user_id', 'revision'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    tabela = db.Column(db.String(20), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    turma_id = db.Column(db.Integer, nullable=True)
+    revision = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,80 @@
+from io import BytesIO
+from PIL import Image, ImageOps, features
+
+PHOTO_SIZES = (48, 128, 256)
+# Decoded size cap: a small compressed upload can still declare a huge canvas
+PHOTO_MAX_PIXELS = 25_000_000
+
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+]
+
+
+def detect_image_format(data):
+    """Image format from the file's magic bytes, or None if it isn't an accepted image"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return image_format
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def pick_photo_size(requested):
+    """Smallest stored variant that is at least the requested size"""
+    if not requested:
+        return PHOTO_SIZES[-1]
+    for size in PHOTO_SIZES:
+        if size >= requested:
+            return size
+    return PHOTO_SIZES[-1]
+
+
+def build_photo_variants(data):
+    """Validates an uploaded image and returns (mimetype, {size: bytes}) for every PHOTO_SIZES entry.
+
+    Raises ValueError when the upload is not a PNG/JPEG/GIF/WEBP image, is larger than
+    PHOTO_MAX_PIXELS or cannot be decoded.
+    """
+    image_format = detect_image_format(data)
+    if image_format is None:
+        raise ValueError("Formato de imagem nao permitido. Use PNG, JPG, JPEG, GIF ou WEBP.")
+
+    try:
+        image = Image.open(BytesIO(data), formats=[image_format])
+    except Exception:
+        raise ValueError("Nao foi possivel ler a imagem enviada. Verifique se o arquivo nao esta corrompido.")
+
+    # Only the header has been read so far; refuse oversized images before decoding any pixels
+    width, height = image.size
+    if width * height > PHOTO_MAX_PIXELS:
+        raise ValueError(f"A imagem enviada e muito grande. Use uma imagem de ate {PHOTO_MAX_PIXELS // 1_000_000} megapixels.")
+
+    if image_format == 'JPEG':
+        # Let the JPEG decoder downscale while decoding; still large enough for the biggest variant
+        image.draft('RGB', (PHOTO_SIZES[-1], PHOTO_SIZES[-1]))
+
+    try:
+        image.load()
+    except Exception:
+        raise ValueError("Nao foi possivel ler a imagem enviada. Verifique se o arquivo nao esta corrompido.")
+
+    image = ImageOps.exif_transpose(image)
+
+    if features.check('webp'):
+        output_format, mimetype, mode = 'WEBP', 'image/webp', 'RGBA'
+    else:
+        output_format, mimetype, mode = 'JPEG', 'image/jpeg', 'RGB'
+    image = image.convert(mode)
+
+    variants = {}
+    for size in PHOTO_SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        thumbnail.save(buffer, output_format, quality=85)
+        variants[size] = buffer.getvalue()
+
+    return mimetype, variants
@@ -0,0 +1,95 @@
+"""Disk cache for rendered PDF/XLSX reports.
+
+Entries are addressed by a hash of (user_id, turma_id, format, data version,
+layout version). The data version comes from Turma.revision, which every write
+endpoint bumps, so a changed turma simply produces a new key and stale entries
+age out through the size-bounded LRU eviction (file mtime = last access).
+"""
+import os
+import time
+import hashlib
+from app import db
+from models import Turma
+from reports import render_pdf, render_xlsx, report_filename, REPORT_LAYOUT_VERSION
+
+REPORT_CACHE_DIR = os.path.join('data', 'report_cache')
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+RENDERERS = {
+    'pdf': render_pdf,
+    'xlsx': render_xlsx,
+}
+
+
+def report_cache_key(user_id, turma_id, export_format):
+    """Returns (key, turma) for the current data version of the requested report"""
+    if turma_id:
+        turma = Turma.query.filter_by(id=turma_id, user_id=user_id).first()
+        revisions = [(turma.id, turma.revision or 0)] if turma else []
+    else:
+        turma = None
+        revisions = db.session.query(Turma.id, Turma.revision).filter_by(user_id=user_id).order_by(Turma.id).all()
+
+    version = ",".join(f"{tid}:{revision or 0}" for tid, revision in revisions)
+    raw = f"{REPORT_LAYOUT_VERSION}|{user_id}|{turma_id or ''}|{export_format}|{version}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest(), turma
+
+
+def _cache_path(key, export_format):
+    return os.path.join(REPORT_CACHE_DIR, f"{key}.{export_format}")
+
+
+def evict_reports(max_bytes=REPORT_CACHE_MAX_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes"""
+    if not os.path.isdir(REPORT_CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(REPORT_CACHE_DIR):
+        path = os.path.join(REPORT_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def find_report(user_id, turma_id, export_format):
+    """Returns (path, filename, key, turma); path is None on a miss, nothing is rendered"""
+    key, turma = report_cache_key(user_id, turma_id, export_format)
+    path = _cache_path(key, export_format)
+
+    if os.path.exists(path):
+        try:
+            now = time.time()
+            os.utime(path, (now, now))
+            return path, report_filename(turma, export_format), key, turma
+        except OSError:
+            pass
+    return None, None, key, turma
+
+
+def get_report(user_id, turma_id, export_format):
+    """Returns (path, filename, key), rendering and caching the report on a miss"""
+    path, filename, key, _ = find_report(user_id, turma_id, export_format)
+    if path:
+        return path, filename, key
+
+    path = _cache_path(key, export_format)
+    buffer, filename = RENDERERS[export_format](user_id, turma_id)
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+    os.replace(tmp_path, path)
+    evict_reports()
+    return path, filename, key
@@ -0,0 +1,176 @@
+"""Styles shared by the PDF and XLSX exports.
+
+The ReportLab objects are built once at import time and only read while
+rendering, so they are safe to share between requests and the export job
+threads. openpyxl named styles are bound to a workbook, so add_xlsx_styles()
+registers a fresh set on each one.
+"""
+from copy import copy
+from openpyxl.styles import NamedStyle, Font, Alignment, PatternFill, Border, Side
+from openpyxl.styles.fonts import DEFAULT_FONT
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.lib.utils import simpleSplit
+from reportlab.platypus import TableStyle
+
+PAGE_OPTIONS = {
+    'pagesize': landscape(A4),
+    'rightMargin': 1*cm,
+    'leftMargin': 1*cm,
+    'topMargin': 1*cm,
+    'bottomMargin': 1*cm,
+}
+
+COLOR_PRIMARY = colors.HexColor('#3B82F6')
+COLOR_SUCCESS = colors.HexColor('#059669')
+COLOR_SUCCESS_LIGHT = colors.HexColor('#D1FAE5')
+COLOR_SUCCESS_LIGHTER = colors.HexColor('#ECFDF5')
+COLOR_GRID = colors.HexColor('#E5E7EB')
+
+CELL_FONT = 'Helvetica'
+CELL_FONT_SIZE = 7
+CELL_LEADING = 9
+
+_styles = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_styles['Heading1'],
+    fontSize=18,
+    spaceAfter=10,
+    alignment=1
+)
+
+SUBTITLE_STYLE = ParagraphStyle(
+    'Subtitle',
+    parent=_styles['Normal'],
+    fontSize=12,
+    spaceAfter=5,
+    alignment=1,
+    textColor=colors.HexColor('#4B5563')
+)
+
+INFO_STYLE = ParagraphStyle(
+    'InfoStyle',
+    parent=_styles['Normal'],
+    fontSize=9,
+    spaceAfter=3,
+    textColor=colors.HexColor('#374151')
+)
+
+SECTION_TITLE_STYLE = ParagraphStyle(
+    'SectionTitle',
+    parent=_styles['Heading2'],
+    fontSize=14,
+    spaceBefore=20,
+    spaceAfter=10,
+    textColor=COLOR_SUCCESS
+)
+
+WEEKS_CELL_PADDING = 4
+WEEKS_COL_WIDTHS = [1.5*cm, 1.2*cm, 4.5*cm, 3.5*cm, 5.5*cm, 4*cm, 3.5*cm]
+WEEKS_COL_WIDTHS_ALL_TURMAS = [1.3*cm, 1*cm, 2.5*cm, 4*cm, 3*cm, 5*cm, 3.5*cm, 3*cm]
+
+# Text columns start at index 2 in both layouts (after Status and Semana)
+WEEKS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), COLOR_PRIMARY),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (2, 1), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 8),
+    ('FONTNAME', (2, 1), (-1, -1), CELL_FONT),
+    ('FONTSIZE', (2, 1), (-1, -1), CELL_FONT_SIZE),
+    ('LEADING', (2, 1), (-1, -1), CELL_LEADING),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('TOPPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 0.5, COLOR_GRID),
+    ('LEFTPADDING', (0, 0), (-1, -1), WEEKS_CELL_PADDING),
+    ('RIGHTPADDING', (0, 0), (-1, -1), WEEKS_CELL_PADDING),
+    ('TOPPADDING', (0, 1), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+])
+
+CAPS_CELL_PADDING = 6
+CAPS_COL_WIDTHS = [2*cm, 6*cm, 18*cm]
+
+CAPS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), COLOR_SUCCESS),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('FONTNAME', (1, 1), (-1, -1), CELL_FONT),
+    ('FONTSIZE', (1, 1), (-1, -1), CELL_FONT_SIZE),
+    ('LEADING', (1, 1), (-1, -1), CELL_LEADING),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('TOPPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 0.5, COLOR_GRID),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, COLOR_SUCCESS_LIGHTER]),
+    ('LEFTPADDING', (0, 0), (-1, -1), CAPS_CELL_PADDING),
+    ('RIGHTPADDING', (0, 0), (-1, -1), CAPS_CELL_PADDING),
+    ('TOPPADDING', (0, 1), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+])
+
+
+def wrap_cell(text, width, keep_lines=False):
+    """Pre-wraps plain text for a table cell of the given inner width.
+
+    Tables draw multi-line strings directly, which is much cheaper than a
+    Paragraph per cell. Like a Paragraph, whitespace (newlines included) is
+    collapsed unless keep_lines is set.
+    """
+    if not text:
+        return ''
+    lines = text.split('\n') if keep_lines else [' '.join(text.split())]
+    wrapped = []
+    for line in lines:
+        wrapped.extend(simpleSplit(line, CELL_FONT, CELL_FONT_SIZE, width) or [''])
+    return '\n'.join(wrapped)
+
+
+def _xlsx_style(name, font=None, fill=None, alignment=None, border=None):
+    style = NamedStyle(name=name, font=copy(font or DEFAULT_FONT))
+    if fill:
+        style.fill = PatternFill(start_color=fill, end_color=fill, fill_type="solid")
+    if alignment:
+        style.alignment = alignment
+    if border:
+        style.border = border
+    return style
+
+
+def add_xlsx_styles(wb):
+    """Registers the named cell styles used by the cronograma workbook"""
+    thin = Side(style='thin', color='E5E7EB')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    cell_alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
+    center_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+
+    styles = [
+        _xlsx_style('cronograma_title', font=Font(bold=True, size=16), alignment=Alignment(horizontal="center")),
+        _xlsx_style('cronograma_title_green', font=Font(bold=True, size=16, color="059669"), alignment=Alignment(horizontal="center")),
+        _xlsx_style('cronograma_centered', alignment=Alignment(horizontal="center")),
+        _xlsx_style('cronograma_progress', font=Font(bold=True, color="059669"), alignment=Alignment(horizontal="center")),
+        _xlsx_style('cronograma_header', font=header_font, fill="3B82F6", alignment=header_alignment, border=border),
+        _xlsx_style('cronograma_header_green', font=header_font, fill="059669", alignment=header_alignment, border=border),
+        _xlsx_style('cronograma_cell', alignment=cell_alignment, border=border),
+        _xlsx_style('cronograma_cell_center', alignment=center_alignment, border=border),
+        _xlsx_style('cronograma_cell_done', fill="D1FAE5", alignment=cell_alignment, border=border),
+        _xlsx_style('cronograma_cell_center_done', fill="D1FAE5", alignment=center_alignment, border=border),
+        _xlsx_style('cronograma_status_done', font=Font(color="059669"), fill="D1FAE5", alignment=center_alignment, border=border),
+        _xlsx_style('cronograma_cell_zebra', fill="ECFDF5", alignment=cell_alignment, border=border),
+        _xlsx_style('cronograma_cell_center_zebra', fill="ECFDF5", alignment=center_alignment, border=border),
+    ]
+    for style in styles:
+        wb.add_named_style(style)
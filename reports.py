@@ -0,0 +1,503 @@
+import hashlib
+from datetime import datetime
+from io import BytesIO
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.writer.excel import ExcelWriter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from sqlalchemy import func, case
+from app import db
+from models import Schedule, Turma, parse_capacidades
+from report_styles import (
+    PAGE_OPTIONS, TITLE_STYLE, SUBTITLE_STYLE, INFO_STYLE, SECTION_TITLE_STYLE,
+    WEEKS_TABLE_STYLE, WEEKS_COL_WIDTHS, WEEKS_COL_WIDTHS_ALL_TURMAS, WEEKS_CELL_PADDING,
+    CAPS_TABLE_STYLE, CAPS_COL_WIDTHS, CAPS_CELL_PADDING,
+    COLOR_SUCCESS, COLOR_SUCCESS_LIGHT, wrap_cell, add_xlsx_styles
+)
+
+PDF_MIMETYPE = 'application/pdf'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Bump whenever the rendered layout changes so cached reports are not reused
+REPORT_LAYOUT_VERSION = 2
+
+# Fixed timestamp for the import template so every process builds identical bytes
+TEMPLATE_TIMESTAMP = datetime(2024, 1, 1)
+
+_import_template = None
+
+
+def report_filename(turma, extension):
+    return f"cronograma_{turma.nome.replace(' ', '_')}.{extension}" if turma else f"cronograma.{extension}"
+
+
+def render_pdf(user_id, turma_id=None):
+    """Builds the cronograma PDF and returns (buffer, filename)"""
+    
+    query = Schedule.query_with_turma().filter_by(user_id=user_id)
+    if turma_id:
+        query = query.filter_by(turma_id=turma_id)
+    
+    schedules = query.order_by(Schedule.semana).all()
+    weeks = [s.to_dict() for s in schedules]
+    
+    turma = None
+    if turma_id:
+        turma = Turma.query.filter_by(id=turma_id, user_id=user_id).first()
+    
+    all_capacidades_desenvolvidas = []
+    total_capacidades = 0
+    total_completed = 0
+    completed_weeks = 0
+    
+    for week in weeks:
+        if week.get('completed'):
+            completed_weeks += 1
+        
+        caps = [c.strip() for c in week.get('capacidades', '').split('\n') if c.strip()]
+        completed_list = week.get('capacidades_completed', '').split(',') if week.get('capacidades_completed') else []
+        completed_list = [x for x in completed_list if x]
+        
+        total_capacidades += len(caps)
+        total_completed += len(completed_list)
+        
+        for idx, cap in enumerate(caps):
+            is_completed = str(idx) in completed_list
+            if is_completed:
+                all_capacidades_desenvolvidas.append({
+                    'semana': week['semana'],
+                    'capacidade': cap,
+                    'unidade': week.get('unidadeCurricular', '')
+                })
+    
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, **PAGE_OPTIONS)
+    
+    elements = []
+    
+    if turma:
+        elements.append(Paragraph(f"Cronograma - {turma.nome}", TITLE_STYLE))
+        if turma.descricao:
+            elements.append(Paragraph(turma.descricao, SUBTITLE_STYLE))
+        elements.append(Spacer(1, 10))
+        
+        info_items = []
+        if turma.carga_horaria:
+            info_items.append(f"<b>Carga Horaria:</b> {turma.carga_horaria}h")
+        if turma.dias_aula:
+            info_items.append(f"<b>Dias de Aula:</b> {turma.dias_aula}")
+        if turma.horario_inicio and turma.horario_fim:
+            info_items.append(f"<b>Horario:</b> {turma.horario_inicio} - {turma.horario_fim}")
+        elif turma.horario_inicio:
+            info_items.append(f"<b>Horario:</b> {turma.horario_inicio}")
+        
+        if turma.data_inicio or turma.data_fim:
+            data_inicio_str = turma.data_inicio.strftime('%d/%m/%Y') if turma.data_inicio else '-'
+            data_fim_str = turma.data_fim.strftime('%d/%m/%Y') if turma.data_fim else '-'
+            info_items.append(f"<b>Periodo:</b> {data_inicio_str} a {data_fim_str}")
+        
+        if info_items:
+            info_text = " &nbsp;&nbsp;|&nbsp;&nbsp; ".join(info_items)
+            elements.append(Paragraph(info_text, INFO_STYLE))
+            elements.append(Spacer(1, 10))
+    else:
+        elements.append(Paragraph("Aula Planner Pro - Cronograma Completo", TITLE_STYLE))
+        elements.append(Spacer(1, 10))
+    
+    progress_percent_weeks = round((completed_weeks / len(weeks) * 100) if len(weeks) > 0 else 0)
+    progress_percent_caps = round((total_completed / total_capacidades * 100) if total_capacidades > 0 else 0)
+    
+    progress_text = f"<b>Progresso:</b> {completed_weeks}/{len(weeks)} semanas concluidas ({progress_percent_weeks}%) | {total_completed}/{total_capacidades} capacidades desenvolvidas ({progress_percent_caps}%)"
+    elements.append(Paragraph(progress_text, INFO_STYLE))
+    elements.append(Spacer(1, 15))
+    
+    headers = ["Status", "Semana", "Atividades", "Unidade Curricular", "Capacidades", "Conhecimentos", "Recursos"]
+    col_widths = WEEKS_COL_WIDTHS
+    
+    if not turma_id:
+        headers.insert(2, "Turma")
+        col_widths = WEEKS_COL_WIDTHS_ALL_TURMAS
+    
+    text_widths = [w - 2 * WEEKS_CELL_PADDING for w in col_widths[2:]]
+    capacidades_col = headers.index("Capacidades")
+    
+    data = [headers]
+    for week in weeks:
+        status = "Concluida" if week.get('completed') else "Pendente"
+        
+        caps = [c.strip() for c in week.get('capacidades', '').split('\n') if c.strip()]
+        completed_list = week.get('capacidades_completed', '').split(',') if week.get('capacidades_completed') else []
+        completed_list = [x for x in completed_list if x]
+        
+        capacidades_formatted = []
+        for idx, cap in enumerate(caps):
+            if str(idx) in completed_list:
+                capacidades_formatted.append(f"[OK] {cap}")
+            else:
+                capacidades_formatted.append(f"[ ] {cap}")
+        
+        capacidades_text = "\n".join(capacidades_formatted) if capacidades_formatted else week.get('capacidades', '')
+        
+        texts = [week["atividades"], week["unidadeCurricular"], capacidades_text, week["conhecimentos"], week["recursos"]]
+        if not turma_id:
+            texts.insert(0, week.get("turma_nome", ""))
+        
+        row = [status, str(week["semana"])]
+        for col, (text, width) in enumerate(zip(texts, text_widths), 2):
+            row.append(wrap_cell(text, width, keep_lines=(col == capacidades_col)))
+        data.append(row)
+    
+    table = Table(data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(WEEKS_TABLE_STYLE)
+    
+    completed_rows = []
+    for idx, week in enumerate(weeks, 1):
+        if week.get('completed'):
+            completed_rows.append(('BACKGROUND', (0, idx), (-1, idx), COLOR_SUCCESS_LIGHT))
+            completed_rows.append(('TEXTCOLOR', (0, idx), (0, idx), COLOR_SUCCESS))
+            completed_rows.append(('TEXTCOLOR', (capacidades_col, idx), (capacidades_col, idx), COLOR_SUCCESS))
+    if completed_rows:
+        table.setStyle(TableStyle(completed_rows))
+    elements.append(table)
+    
+    if all_capacidades_desenvolvidas:
+        elements.append(Spacer(1, 30))
+        elements.append(Paragraph("Capacidades Desenvolvidas", SECTION_TITLE_STYLE))
+        elements.append(Spacer(1, 10))
+        
+        summary_info = f"Total de {len(all_capacidades_desenvolvidas)} capacidades desenvolvidas ao longo do curso."
+        elements.append(Paragraph(summary_info, INFO_STYLE))
+        elements.append(Spacer(1, 10))
+        
+        unidade_width = CAPS_COL_WIDTHS[1] - 2 * CAPS_CELL_PADDING
+        capacidade_width = CAPS_COL_WIDTHS[2] - 2 * CAPS_CELL_PADDING
+        
+        caps_headers = ["Semana", "Unidade Curricular", "Capacidade Desenvolvida"]
+        caps_data = [caps_headers]
+        
+        for cap_info in all_capacidades_desenvolvidas:
+            caps_data.append([
+                str(cap_info['semana']),
+                wrap_cell(cap_info['unidade'], unidade_width),
+                wrap_cell(cap_info['capacidade'], capacidade_width)
+            ])
+        
+        caps_table = Table(caps_data, colWidths=CAPS_COL_WIDTHS, repeatRows=1)
+        caps_table.setStyle(CAPS_TABLE_STYLE)
+        elements.append(caps_table)
+    
+    doc.build(elements)
+    buffer.seek(0)
+    
+    filename = report_filename(turma, 'pdf')
+    
+    return buffer, filename
+
+
+def _xlsx_row(ws, values, style):
+    """Appends one row of WriteOnlyCells; style is a named style or one per column"""
+    styles = [style] * len(values) if isinstance(style, str) else style
+    row = []
+    for value, cell_style in zip(values, styles):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = cell_style
+        row.append(cell)
+    ws.append(row)
+
+
+def _xlsx_banner(ws, row, value, style, last_column):
+    """Appends a single value merged across A..last_column (row must be the next row number)"""
+    ws.merged_cells.add(f'A{row}:{last_column}{row}')
+    _xlsx_row(ws, [value], style)
+
+
+def render_xlsx(user_id, turma_id=None):
+    """Builds the cronograma workbook and returns (buffer, filename).
+
+    Uses a write-only workbook and streams the schedules, so memory stays flat
+    no matter how many weeks the account has.
+    """
+    filters = [Schedule.user_id == user_id]
+    if turma_id:
+        filters.append(Schedule.turma_id == turma_id)
+    
+    turma = None
+    if turma_id:
+        turma = Turma.query.filter_by(id=turma_id, user_id=user_id).first()
+    
+    totals = db.session.query(
+        func.count(Schedule.id),
+        func.coalesce(func.sum(case((Schedule.completed.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(Schedule.capacidades_total), 0),
+        func.coalesce(func.sum(Schedule.capacidades_done), 0),
+    ).filter(*filters).one()
+    total_weeks, completed_weeks, total_capacidades, total_completed = (int(value) for value in totals)
+    
+    wb = Workbook(write_only=True)
+    add_xlsx_styles(wb)
+    ws = wb.create_sheet(title="Cronograma")
+    
+    if turma_id:
+        col_widths = [12, 10, 40, 25, 40, 30, 25]
+    else:
+        col_widths = [12, 10, 20, 35, 22, 35, 25, 22]
+    
+    for i, width in enumerate(col_widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    
+    current_row = 1
+    
+    if turma:
+        _xlsx_banner(ws, current_row, f"Cronograma - {turma.nome}", 'cronograma_title', 'H')
+        current_row += 1
+        
+        if turma.descricao:
+            _xlsx_banner(ws, current_row, turma.descricao, 'cronograma_centered', 'H')
+            current_row += 1
+        
+        info_parts = []
+        if turma.carga_horaria:
+            info_parts.append(f"Carga Horaria: {turma.carga_horaria}h")
+        if turma.dias_aula:
+            info_parts.append(f"Dias de Aula: {turma.dias_aula}")
+        if turma.horario_inicio and turma.horario_fim:
+            info_parts.append(f"Horario: {turma.horario_inicio} - {turma.horario_fim}")
+        if turma.data_inicio or turma.data_fim:
+            data_inicio_str = turma.data_inicio.strftime('%d/%m/%Y') if turma.data_inicio else '-'
+            data_fim_str = turma.data_fim.strftime('%d/%m/%Y') if turma.data_fim else '-'
+            info_parts.append(f"Periodo: {data_inicio_str} a {data_fim_str}")
+        
+        if info_parts:
+            _xlsx_banner(ws, current_row, " | ".join(info_parts), 'cronograma_centered', 'H')
+            current_row += 1
+    else:
+        _xlsx_banner(ws, current_row, "Aula Planner Pro - Cronograma Completo", 'cronograma_title', 'H')
+        current_row += 1
+    ws.append([])
+    current_row += 1
+    
+    progress_percent_weeks = round((completed_weeks / total_weeks * 100) if total_weeks > 0 else 0)
+    progress_percent_caps = round((total_completed / total_capacidades * 100) if total_capacidades > 0 else 0)
+    
+    _xlsx_banner(ws, current_row, f"Progresso: {completed_weeks}/{total_weeks} semanas concluidas ({progress_percent_weeks}%) | {total_completed}/{total_capacidades} capacidades desenvolvidas ({progress_percent_caps}%)", 'cronograma_progress', 'H')
+    ws.append([])
+    
+    if turma_id:
+        headers = ["Status", "Semana", "Atividades", "Unidade Curricular", "Capacidades", "Conhecimentos", "Recursos"]
+    else:
+        headers = ["Status", "Semana", "Turma", "Atividades", "Unidade Curricular", "Capacidades", "Conhecimentos", "Recursos"]
+    
+    _xlsx_row(ws, headers, 'cronograma_header')
+    
+    text_columns = len(headers) - 2
+    pending_styles = ['cronograma_cell_center'] * 2 + ['cronograma_cell'] * text_columns
+    completed_styles = ['cronograma_status_done', 'cronograma_cell_center_done'] + ['cronograma_cell_done'] * text_columns
+    
+    capacidades_desenvolvidas_count = 0
+    
+    schedules = Schedule.query_with_turma().filter(*filters).order_by(Schedule.semana, Schedule.id).yield_per(500)
+    for schedule in schedules:
+        week = schedule.to_dict()
+        status = "Concluida" if week.get('completed') else "Pendente"
+        
+        caps = [c.strip() for c in week.get('capacidades', '').split('\n') if c.strip()]
+        completed_list = week.get('capacidades_completed', '').split(',') if week.get('capacidades_completed') else []
+        completed_list = [x for x in completed_list if x]
+        
+        capacidades_formatted = []
+        for idx, cap in enumerate(caps):
+            if str(idx) in completed_list:
+                capacidades_formatted.append(f"[OK] {cap}")
+                capacidades_desenvolvidas_count += 1
+            else:
+                capacidades_formatted.append(f"[ ] {cap}")
+        
+        capacidades_text = "\n".join(capacidades_formatted) if capacidades_formatted else week.get('capacidades', '')
+        
+        if turma_id:
+            row_data = [
+                status,
+                week["semana"],
+                week["atividades"],
+                week["unidadeCurricular"],
+                capacidades_text,
+                week["conhecimentos"],
+                week["recursos"]
+            ]
+        else:
+            row_data = [
+                status,
+                week["semana"],
+                week.get("turma_nome", ""),
+                week["atividades"],
+                week["unidadeCurricular"],
+                capacidades_text,
+                week["conhecimentos"],
+                week["recursos"]
+            ]
+        
+        _xlsx_row(ws, row_data, completed_styles if week.get('completed') else pending_styles)
+    
+    if capacidades_desenvolvidas_count:
+        # Second pass over just the capacidades columns, so the developed list never has to be held in memory
+        ws_caps = wb.create_sheet(title="Capacidades Desenvolvidas")
+        ws_caps.column_dimensions['A'].width = 10
+        ws_caps.column_dimensions['B'].width = 30
+        ws_caps.column_dimensions['C'].width = 80
+        
+        _xlsx_banner(ws_caps, 1, "Capacidades Desenvolvidas", 'cronograma_title_green', 'C')
+        _xlsx_banner(ws_caps, 2, f"Total de {capacidades_desenvolvidas_count} capacidades desenvolvidas ao longo do curso", 'cronograma_centered', 'C')
+        ws_caps.append([])
+        _xlsx_row(ws_caps, ["Semana", "Unidade Curricular", "Capacidade Desenvolvida"], 'cronograma_header_green')
+        
+        plain_styles = ['cronograma_cell_center', 'cronograma_cell', 'cronograma_cell']
+        zebra_styles = ['cronograma_cell_center_zebra', 'cronograma_cell_zebra', 'cronograma_cell_zebra']
+        
+        rows = db.session.query(
+            Schedule.semana, Schedule.unidade_curricular, Schedule.capacidades, Schedule.capacidades_mask
+        ).filter(*filters, Schedule.capacidades_mask != 0).order_by(Schedule.semana, Schedule.id).yield_per(1000)
+        
+        written = 0
+        for semana, unidade, capacidades, capacidades_mask in rows:
+            for idx, cap in enumerate(parse_capacidades(capacidades)):
+                if (capacidades_mask or 0) >> idx & 1:
+                    _xlsx_row(ws_caps, [semana, unidade, cap], zebra_styles if written % 2 else plain_styles)
+                    written += 1
+    
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    
+    filename = report_filename(turma, 'xlsx')
+    
+    return buffer, filename
+
+
+def build_import_template():
+    """Builds the import template workbook"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Cronograma"
+    
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    header_fill = PatternFill(start_color="3B82F6", end_color="3B82F6", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    cell_alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
+    thin_border = Border(
+        left=Side(style='thin', color='E5E7EB'),
+        right=Side(style='thin', color='E5E7EB'),
+        top=Side(style='thin', color='E5E7EB'),
+        bottom=Side(style='thin', color='E5E7EB')
+    )
+    
+    ws.merge_cells('A1:G1')
+    title_cell = ws.cell(row=1, column=1, value="Template de Importacao de Cronograma")
+    title_cell.font = Font(bold=True, size=16, color="3B82F6")
+    title_cell.alignment = Alignment(horizontal="center")
+    
+    ws.merge_cells('A2:G2')
+    subtitle_cell = ws.cell(row=2, column=1, value="Preencha as informacoes abaixo e faca o upload para importar as semanas automaticamente")
+    subtitle_cell.font = Font(size=10, color="6B7280")
+    subtitle_cell.alignment = Alignment(horizontal="center")
+    
+    headers = [
+        "Semana",
+        "Atividades Praticas e Teoricas", 
+        "Unidade Curricular",
+        "Capacidades Desenvolvidas",
+        "Conhecimentos Trabalhados",
+        "Recursos"
+    ]
+    
+    header_row = 4
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=header_row, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+    
+    example_data = [
+        [1, "Apresentacao do curso e introducao aos conceitos basicos", "Fundamentos de Programacao", "Compreender os conceitos basicos de logica de programacao\nIdentificar estruturas de dados simples", "Algoritmos\nLogica de programacao\nVariaveis e tipos de dados", "Computador, Projetor, Material didatico"],
+        [2, "Pratica de algoritmos e estruturas de controle", "Fundamentos de Programacao", "Desenvolver algoritmos utilizando estruturas de controle\nAplicar estruturas de repeticao", "Estruturas condicionais\nLacos de repeticao\nFuncoes", "Laboratoro de informatica, IDE de programacao"],
+        [3, "Introducao a orientacao a objetos", "Programacao Orientada a Objetos", "Compreender os principios da POO\nImplementar classes e objetos", "Classes e objetos\nEncapsulamento\nHeranca", "Computador, Ambiente de desenvolvimento"],
+    ]
+    
+    for row_idx, row_data in enumerate(example_data, header_row + 1):
+        for col_idx, value in enumerate(row_data, 1):
+            cell = ws.cell(row=row_idx, column=col_idx, value=value)
+            cell.alignment = cell_alignment
+            cell.border = thin_border
+    
+    col_widths = [10, 50, 30, 50, 40, 35]
+    for i, width in enumerate(col_widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    
+    for row in range(header_row + 1, header_row + 51):
+        for col in range(1, 7):
+            cell = ws.cell(row=row, column=col)
+            cell.border = thin_border
+            cell.alignment = cell_alignment
+    
+    ws_instrucoes = wb.create_sheet(title="Instrucoes")
+    
+    instrucoes = [
+        ("Instrucoes de Preenchimento", True, 16),
+        ("", False, 11),
+        ("1. SEMANA: Numero da semana (obrigatorio). Deve ser um numero inteiro.", False, 11),
+        ("", False, 11),
+        ("2. ATIVIDADES PRATICAS E TEORICAS: Descricao das atividades da semana.", False, 11),
+        ("   Pode incluir tanto atividades praticas quanto teoricas.", False, 11),
+        ("", False, 11),
+        ("3. UNIDADE CURRICULAR: Nome da disciplina ou modulo.", False, 11),
+        ("", False, 11),
+        ("4. CAPACIDADES DESENVOLVIDAS: Liste as capacidades que serao desenvolvidas.", False, 11),
+        ("   Separe cada capacidade em uma linha diferente (pressione Alt+Enter para quebra de linha).", False, 11),
+        ("", False, 11),
+        ("5. CONHECIMENTOS TRABALHADOS: Liste os conhecimentos abordados.", False, 11),
+        ("   Separe cada conhecimento em uma linha diferente.", False, 11),
+        ("", False, 11),
+        ("6. RECURSOS: Materiais e recursos necessarios para a semana.", False, 11),
+        ("   Pode ser uma lista separada por virgulas.", False, 11),
+        ("", False, 11),
+        ("IMPORTANTE:", True, 12),
+        ("- A primeira linha de dados (linha 5) contem exemplos. Pode mante-los ou apaga-los.", False, 11),
+        ("- Nao altere os cabecalhos na linha 4.", False, 11),
+        ("- Semanas com numero duplicado serao ignoradas.", False, 11),
+        ("- Linhas sem numero de semana serao ignoradas.", False, 11),
+    ]
+    
+    for row_idx, (texto, negrito, tamanho) in enumerate(instrucoes, 1):
+        cell = ws_instrucoes.cell(row=row_idx, column=1, value=texto)
+        cell.font = Font(bold=negrito, size=tamanho, color="3B82F6" if negrito else "374151")
+    
+    ws_instrucoes.column_dimensions['A'].width = 100
+    
+    return wb
+
+
+def _reproducible_xlsx(wb):
+    """Serializes wb with pinned document and zip timestamps, so the bytes depend only on the content"""
+    wb.properties.created = wb.properties.modified = TEMPLATE_TIMESTAMP
+    raw = BytesIO()
+    with ZipFile(raw, 'w', ZIP_DEFLATED) as archive:
+        ExcelWriter(wb, archive).write_data()
+    
+    buffer = BytesIO()
+    date_time = TEMPLATE_TIMESTAMP.timetuple()[:6]
+    with ZipFile(raw) as source, ZipFile(buffer, 'w', ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            target.writestr(ZipInfo(info.filename, date_time=date_time), source.read(info.filename), ZIP_DEFLATED)
+    return buffer.getvalue()
+
+
+def import_template():
+    """Returns (bytes, etag) of the import template, built once per process"""
+    global _import_template
+    if _import_template is None:
+        data = _reproducible_xlsx(build_import_template())
+        _import_template = (data, hashlib.sha256(data).hexdigest()[:32])
+    return _import_template
@@ -1,4 +1,8 @@
 let weeks = [];
+let weeksRevision = 0;
+
+// Stop polling an export job after this many 1s checks
+const EXPORT_POLL_MAX_ATTEMPTS = 300;
 let turmas = [];
 let currentWeek = null;
 let currentTurma = null;
@@ -135,7 +139,42 @@ async function selectTurma(turmaId) {
 function updateExportLinks() {
     if (currentTurma) {
         document.getElementById('exportJsonLink').href = `/api/export/json?turma_id=${currentTurma.id}`;
-        document.getElementById('exportPdfLink').href = `/api/export/pdf?turma_id=${currentTurma.id}`;
+    }
+}
+
+async function runExportJob(format) {
+    document.getElementById('exportMenu').classList.add('hidden');
+    try {
+        const response = await fetch('/api/export/jobs', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ format, turma_id: currentTurma ? currentTurma.id : null })
+        });
+        let job = await response.json();
+        if (!response.ok) {
+            showToast(job.error || 'Erro ao exportar', 'error');
+            return;
+        }
+        
+        showToast('Gerando relatorio...');
+        for (let attempt = 0; job.status === 'queued' || job.status === 'running'; attempt++) {
+            if (attempt >= EXPORT_POLL_MAX_ATTEMPTS) {
+                showToast('Tempo esgotado aguardando o relatorio. Tente novamente.', 'error');
+                return;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const statusResponse = await fetch(job.status_url);
+            job = await statusResponse.json();
+            if (!statusResponse.ok) break;
+        }
+        
+        if (job.status === 'done') {
+            window.location.href = job.download_url;
+        } else {
+            showToast(job.error || 'Erro ao gerar relatorio', 'error');
+        }
+    } catch (error) {
+        showToast('Erro ao exportar', 'error');
     }
 }
 
@@ -143,8 +182,10 @@ async function loadWeeks() {
     if (!currentTurma) return;
     
     try {
-        const response = await fetch(`/api/weeks?turma_id=${currentTurma.id}`);
-        weeks = await response.json();
+        const response = await fetch(`/api/weeks?turma_id=${currentTurma.id}&since=0`);
+        const snapshot = await response.json();
+        weeks = snapshot.semanas;
+        weeksRevision = snapshot.revision;
         renderWeeksList();
         populateFilters();
         updateWeekCount();
@@ -160,6 +201,30 @@ async function loadWeeks() {
     }
 }
 
+// Applies only what changed since weeksRevision instead of refetching the whole turma
+async function syncWeeks() {
+    if (!currentTurma) return;
+    const turmaId = currentTurma.id;
+    
+    try {
+        const response = await fetch(`/api/weeks?turma_id=${turmaId}&since=${weeksRevision}`);
+        if (!response.ok) return loadWeeks();
+        const delta = await response.json();
+        if (!currentTurma || currentTurma.id !== turmaId) return;
+        
+        const removidas = new Set([...delta.excluidas, ...delta.semanas.map(w => w.id)]);
+        weeks = weeks.filter(w => !removidas.has(w.id)).concat(delta.semanas);
+        weeks.sort((a, b) => a.semana - b.semana || a.id - b.id);
+        weeksRevision = delta.revision;
+        
+        renderWeeksList();
+        populateFilters();
+        updateWeekCount();
+    } catch (error) {
+        showToast('Erro ao carregar semanas', 'error');
+    }
+}
+
 function renderWeeksList(filteredWeeks = null) {
     const list = document.getElementById('weeksList');
     const weeksToRender = filteredWeeks || weeks;
@@ -400,7 +465,7 @@ async function handleFormSubmit(e) {
         
         if (response.ok) {
             closeModal();
-            await loadWeeks();
+            await syncWeeks();
             
             const savedWeek = weeks.find(w => w.semana === data.semana);
             if (savedWeek) {
@@ -430,7 +495,7 @@ async function deleteCurrentWeek() {
         if (response.ok) {
             closeConfirmModal();
             currentWeek = null;
-            await loadWeeks();
+            await syncWeeks();
             showWelcome();
             showToast('Semana excluida com sucesso!');
         } else {
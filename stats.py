@@ -0,0 +1,185 @@
+from sqlalchemy import func, case, select
+from app import db
+from models import User, Turma, Schedule, parse_capacidades
+
+
+TURMA_COUNTERS = ['semanas_total', 'semanas_done', 'capacidades_total', 'capacidades_done']
+
+
+def _count_where(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def admin_overview_query():
+    """Per-user turma/semana counters for active users in a single grouped query"""
+    turma_stats = db.session.query(
+        Turma.user_id.label('user_id'),
+        func.count(Turma.id).label('turmas_count'),
+        _count_where(Turma.concluida.is_(False)).label('turmas_ativas'),
+        _count_where(Turma.concluida.is_(True)).label('turmas_concluidas'),
+    ).filter(Turma.active.is_(True)).group_by(Turma.user_id).subquery()
+
+    schedule_stats = db.session.query(
+        Schedule.user_id.label('user_id'),
+        func.count(Schedule.id).label('total_semanas'),
+        _count_where(Schedule.completed.is_(True)).label('semanas_concluidas'),
+    ).group_by(Schedule.user_id).subquery()
+
+    columns = {
+        'turmas_count': func.coalesce(turma_stats.c.turmas_count, 0),
+        'turmas_ativas': func.coalesce(turma_stats.c.turmas_ativas, 0),
+        'turmas_concluidas': func.coalesce(turma_stats.c.turmas_concluidas, 0),
+        'total_semanas': func.coalesce(schedule_stats.c.total_semanas, 0),
+        'semanas_concluidas': func.coalesce(schedule_stats.c.semanas_concluidas, 0),
+    }
+
+    query = db.session.query(
+        User, *[expr.label(name) for name, expr in columns.items()]
+    ).outerjoin(
+        turma_stats, turma_stats.c.user_id == User.id
+    ).outerjoin(
+        schedule_stats, schedule_stats.c.user_id == User.id
+    ).filter(User.active.is_(True))
+
+    return query, columns
+
+
+def get_admin_overview(sort=None, order='asc', page=None, per_page=50):
+    """Returns (rows, total) where total is None when no pagination was requested"""
+    query, columns = admin_overview_query()
+
+    if sort in columns:
+        sort_expr = columns[sort]
+        query = query.order_by(sort_expr.desc() if order == 'desc' else sort_expr.asc(), User.id)
+    else:
+        query = query.order_by(User.id)
+
+    total = None
+    if page:
+        total = query.order_by(None).count()
+        query = query.limit(per_page).offset((max(page, 1) - 1) * per_page)
+
+    overview = []
+    for row in query.all():
+        overview.append({
+            "user": row.User.to_dict(),
+            "turmas_count": int(row.turmas_count),
+            "turmas_ativas": int(row.turmas_ativas),
+            "turmas_concluidas": int(row.turmas_concluidas),
+            "total_semanas": int(row.total_semanas),
+            "semanas_concluidas": int(row.semanas_concluidas)
+        })
+
+    return overview, total
+
+
+def turma_progress(turma):
+    """Weeks/capacidades totals read from the counters maintained on Turma"""
+    return {
+        'total_weeks': turma.semanas_total or 0,
+        'completed_weeks': turma.semanas_done or 0,
+        'total_capacidades': turma.capacidades_total or 0,
+        'completed_capacidades': turma.capacidades_done or 0
+    }
+
+
+def refresh_turma_counters(turma_ids, revision=None):
+    """Recompute the rolled-up Turma counters from their schedules in one UPDATE.
+
+    The turmas are stamped with revision, the sync revision the calling write
+    claimed. Without one (migrations, maintenance commands) a new revision is
+    claimed for each owner, so the stamp still moves past everything before it.
+    """
+    turma_ids = [turma_id for turma_id in set(turma_ids) if turma_id]
+    if not turma_ids:
+        return
+
+    db.session.flush()
+
+    if revision is None:
+        users = User.__table__
+        db.session.execute(
+            users.update().where(users.c.id.in_(select(Turma.user_id).where(Turma.id.in_(turma_ids))))
+            .values(sync_revision=func.coalesce(users.c.sync_revision, 0) + 1)
+        )
+        revision = select(users.c.sync_revision).where(users.c.id == Turma.user_id).scalar_subquery()
+
+    def schedule_aggregate(expr):
+        return select(func.coalesce(expr, 0)).where(
+            Schedule.turma_id == Turma.id
+        ).scalar_subquery()
+
+    db.session.execute(
+        Turma.__table__.update().where(Turma.id.in_(turma_ids)).values(
+            semanas_total=schedule_aggregate(func.count(Schedule.id)),
+            semanas_done=schedule_aggregate(func.sum(case((Schedule.completed.is_(True), 1), else_=0))),
+            capacidades_total=schedule_aggregate(func.sum(Schedule.capacidades_total)),
+            capacidades_done=schedule_aggregate(func.sum(Schedule.capacidades_done)),
+            revision=revision,
+        )
+    )
+
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Turma) and obj.id in turma_ids:
+            db.session.expire(obj, TURMA_COUNTERS + ['revision', 'updated_at'])
+
+
+def _iter_schedule_batches(batch_size=1000):
+    last_id = 0
+    while True:
+        batch = Schedule.query.filter(Schedule.id > last_id).order_by(Schedule.id).limit(batch_size).all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+
+
+def backfill_counters(batch_size=1000):
+    """Re-parse every schedule and rebuild all Schedule and Turma counters"""
+    updated = 0
+    for batch in _iter_schedule_batches(batch_size):
+        for schedule in batch:
+            before = (schedule.capacidades_total, schedule.capacidades_done)
+            schedule.update_capacidade_counters()
+            if before != (schedule.capacidades_total, schedule.capacidades_done):
+                updated += 1
+        db.session.commit()
+        db.session.expunge_all()
+
+    turma_ids = [turma_id for (turma_id,) in db.session.query(Turma.id)]
+    for i in range(0, len(turma_ids), batch_size):
+        refresh_turma_counters(turma_ids[i:i + batch_size])
+    db.session.commit()
+    return updated
+
+
+def find_counter_mismatches(batch_size=1000):
+    """Diff the persisted counters against the re-parsed capacidades text"""
+    mismatches = []
+    expected_turmas = {}
+
+    for schedule in (s for batch in _iter_schedule_batches(batch_size) for s in batch):
+        total = len(parse_capacidades(schedule.capacidades))
+        done = (schedule.capacidades_mask or 0).bit_count()
+        if (schedule.capacidades_total, schedule.capacidades_done) != (total, done):
+            mismatches.append({
+                'table': 'schedules',
+                'id': schedule.id,
+                'expected': {'capacidades_total': total, 'capacidades_done': done},
+                'actual': {'capacidades_total': schedule.capacidades_total, 'capacidades_done': schedule.capacidades_done}
+            })
+        expected = expected_turmas.setdefault(schedule.turma_id, {name: 0 for name in TURMA_COUNTERS})
+        expected['semanas_total'] += 1
+        expected['semanas_done'] += 1 if schedule.completed else 0
+        expected['capacidades_total'] += total
+        expected['capacidades_done'] += done
+        db.session.expunge(schedule)
+
+    empty = {name: 0 for name in TURMA_COUNTERS}
+    for turma in Turma.query.order_by(Turma.id):
+        expected = expected_turmas.get(turma.id, empty)
+        actual = {name: getattr(turma, name) for name in TURMA_COUNTERS}
+        if actual != expected:
+            mismatches.append({'table': 'turmas', 'id': turma.id, 'expected': expected, 'actual': actual})
+
+    return mismatches
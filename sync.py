@@ -0,0 +1,95 @@
+"""Per-user sync revisions for delta fetches (GET /api/weeks?since=<revision>).
+
+Every write claims the next value of users.sync_revision and stamps it on the
+schedules and turmas it touches; deleted schedules leave a Tombstone with the
+same revision. Claiming is an UPDATE of the user row, which holds the row lock
+until commit, so a user's revisions always commit in increasing order and a
+client that saw high-water mark R can never later miss a change <= R. Writes
+claim the revision before touching any schedule, keeping one lock order.
+
+Because every other write by the same user waits on that lock, it must only
+be held for a short request-sized transaction. Long writers (file imports)
+write their rows with PENDING_REVISION and commit them without claiming
+anything; stamp_pending_schedules then claims one revision and moves those
+rows onto it in a second, short transaction. Pending rows are invisible to
+deltas until stamped, and a pending row left behind by a crash between the
+two commits is stamped by the turma's next import.
+"""
+from sqlalchemy import func
+from app import db
+from models import User, Schedule, Tombstone
+
+TOMBSTONE_SCHEDULES = 'schedules'
+# Placeholder revision for rows written without holding the user's lock; real revisions start at 1
+PENDING_REVISION = -1
+
+
+def next_revision(user_id):
+    """Claims the user's next revision; the caller stamps it on what it writes and commits"""
+    users = User.__table__
+    return db.session.execute(
+        users.update().where(users.c.id == user_id)
+        .values(sync_revision=func.coalesce(users.c.sync_revision, 0) + 1)
+        .returning(users.c.sync_revision)
+    ).scalar_one()
+
+
+def stamp_pending_schedules(user_id, turma_id):
+    """Claims the user's next revision and stamps it on the turma's PENDING_REVISION rows in one UPDATE.
+
+    Returns the revision; the caller refreshes what else it touched and commits right away.
+    """
+    revision = next_revision(user_id)
+    schedules = Schedule.__table__
+    db.session.execute(
+        schedules.update().where(
+            schedules.c.user_id == user_id,
+            schedules.c.turma_id == turma_id,
+            schedules.c.revision == PENDING_REVISION
+        ).values(revision=revision)
+    )
+    return revision
+
+
+def record_deleted_schedules(user_id, schedule_ids, revision):
+    """Writes the tombstones of schedules about to be deleted, in one INSERT ... SELECT"""
+    schedules = Schedule.__table__
+    db.session.execute(Tombstone.__table__.insert().from_select(
+        ['user_id', 'tabela', 'row_id', 'turma_id', 'revision'],
+        db.select(
+            schedules.c.user_id,
+            db.literal(TOMBSTONE_SCHEDULES),
+            schedules.c.id,
+            schedules.c.turma_id,
+            db.literal(revision),
+        ).where(schedules.c.id.in_(schedule_ids), schedules.c.user_id == user_id)
+    ))
+
+
+def weeks_since(user_id, since, turma_id=None):
+    """Returns (changed schedules, deleted schedule ids, high-water mark) after revision since.
+
+    since=0 is a full snapshot. The mark is read before the rows, so a write
+    committing in between shows up now or in the next delta, never in neither.
+    """
+    revision = db.session.query(User.sync_revision).filter_by(id=user_id).scalar() or 0
+
+    query = Schedule.query_with_turma().filter_by(user_id=user_id)
+    if turma_id:
+        query = query.filter_by(turma_id=turma_id)
+    if since:
+        query = query.filter(Schedule.revision > since)
+    schedules = query.order_by(Schedule.semana, Schedule.id).all()
+
+    excluidas = []
+    if since:
+        tombstones = db.session.query(Tombstone.row_id).filter(
+            Tombstone.user_id == user_id,
+            Tombstone.tabela == TOMBSTONE_SCHEDULES,
+            Tombstone.revision > since
+        )
+        if turma_id:
+            tombstones = tombstones.filter(Tombstone.turma_id == turma_id)
+        excluidas = [row_id for (row_id,) in tombstones.order_by(Tombstone.revision, Tombstone.row_id)]
+
+    return schedules, excluidas, revision